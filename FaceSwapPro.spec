@@ -1,12 +1,15 @@
 # -*- mode: python ; coding: utf-8 -*-
+from PyInstaller.utils.hooks import collect_all, collect_dynamic_libs
 
+insightface_datas, insightface_binaries, insightface_hiddenimports = collect_all('insightface')
 
 a = Analysis(
     ['main.py'],
     pathex=[],
-    binaries=[],
-    datas=[('src', 'src')],
-    hiddenimports=['insightface', 'onnxruntime'],
+    binaries=collect_dynamic_libs('onnxruntime') + insightface_binaries,
+    datas=[('src', 'src')] + insightface_datas,
+    hiddenimports=['insightface', 'onnxruntime', 'onnxruntime.capi._pybind_state']
+    + insightface_hiddenimports,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
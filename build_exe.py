@@ -12,6 +12,65 @@ import os
 import sys
 import shutil
 import subprocess
+import importlib.util
+
+# Caché de paquetes de pip reutilizada entre compilaciones
+PIP_CACHE_DIR = os.environ.get("PIP_CACHE_DIR", os.path.abspath(".pip_cache"))
+
+def pip_install(*args):
+    """
+    Ejecuta pip install usando la caché de paquetes compartida.
+    
+    Args:
+        *args: Argumentos adicionales para pip install.
+    """
+    subprocess.check_call([sys.executable, "-m", "pip", "install",
+                           "--cache-dir", PIP_CACHE_DIR, *args])
+
+def requirements_satisfied(requirements_file):
+    """
+    Comprueba si todas las dependencias de un archivo ya están instaladas.
+    
+    Args:
+        requirements_file (str): Ruta al archivo de dependencias.
+        
+    Returns:
+        bool: True si todas las dependencias están instaladas con una versión
+              compatible, False en caso contrario o si no se puede comprobar.
+    """
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+        from packaging.requirements import InvalidRequirement, Requirement
+    except ImportError:
+        return False
+    
+    with open(requirements_file, "r", encoding="utf-8") as f:
+        lines = [line.split("#")[0].strip() for line in f]
+    
+    for line in lines:
+        if not line:
+            continue
+        try:
+            requirement = Requirement(line)
+            installed = version(requirement.name)
+        except (InvalidRequirement, PackageNotFoundError):
+            return False
+        if not requirement.specifier.contains(installed, prereleases=True):
+            return False
+    
+    return True
+
+def install_requirements(requirements_file):
+    """
+    Instala las dependencias de un archivo solo si falta alguna.
+    
+    Args:
+        requirements_file (str): Ruta al archivo de dependencias.
+    """
+    if requirements_satisfied(requirements_file):
+        print(f"Dependencias de {requirements_file} ya instaladas.")
+        return
+    pip_install("-r", requirements_file)
 
 def main():
     """
@@ -19,27 +78,33 @@ def main():
     """
     print("=== Creando ejecutable de FaceSwapPro ===")
     
+    # En modo --onefile la aplicación se extrae en un directorio temporal en cada
+    # ejecución, por lo que los modelos se descargarían de nuevo cada vez
+    if "--onefile" in sys.argv[1:]:
+        print("Aviso: --onefile no es compatible con la carpeta de modelos persistente. "
+              "Se usará --onedir.")
+    
     # Verificar que PyInstaller está instalado
     try:
         import PyInstaller
         print("PyInstaller encontrado.")
     except ImportError:
         print("PyInstaller no encontrado. Instalando...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "pyinstaller>=5.13.0"])
+        pip_install("pyinstaller>=5.13.0")
     
     # Verificar dependencias
     print("Verificando dependencias...")
     try:
         # Primero intentamos instalar las dependencias de desarrollo
         if os.path.exists("requirements-dev.txt"):
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements-dev.txt"])
+            install_requirements("requirements-dev.txt")
         else:
             print("Archivo requirements-dev.txt no encontrado, instalando solo las dependencias básicas.")
     except subprocess.CalledProcessError:
         print("No se pudieron instalar las dependencias de desarrollo. Continuando...")
     
     # Instalamos las dependencias básicas (necesarias para la aplicación)
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+    install_requirements("requirements.txt")
     
     # Limpiar directorio dist si existe
     if os.path.exists("dist"):
@@ -59,15 +124,22 @@ def main():
     
     # Crear el ejecutable con PyInstaller
     print("Creando ejecutable...")
+    if importlib.util.find_spec("onnxruntime") is None:
+        print("Aviso: no se encontró onnxruntime, el ejecutable puede fallar al cargar el modelo.")
+    
     pyinstaller_cmd = [
         "pyinstaller",
         "--name=FaceSwapPro",
         "--onedir",
         "--windowed",
         "--icon=icon.ico" if os.path.exists("icon.ico") else "",
-        "--add-data=src;src",
+        f"--add-data=src{os.pathsep}src",
+        # Bibliotecas nativas de onnxruntime (como collect_dynamic_libs en el .spec)
+        "--collect-binaries=onnxruntime",
         "--hidden-import=insightface",
         "--hidden-import=onnxruntime",
+        "--hidden-import=onnxruntime.capi._pybind_state",
+        "--collect-all=insightface",
         "main.py"
     ]
     
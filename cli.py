@@ -12,7 +12,10 @@ import argparse
 import os
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 from src import FaceSwapApp
+from src.utils import fast_copy
 
 def parse_arguments():
     """
@@ -77,20 +80,26 @@ def main():
         return 1
     
     # Configurar rutas
-    base_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.abspath(__file__).rpartition(os.sep)[0]
     models_dir = os.path.join(base_dir, "models")
     data_dir = os.path.join(base_dir, "data")
     output_dir = os.path.join(base_dir, "output")
     
     # Crear directorios si no existen
     for directory in [models_dir, data_dir, output_dir]:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)
     
     # Modelo a utilizar
     model_path = os.path.join(models_dir, "inswapper_128.onnx")
     
+    # Decodificar las imágenes en segundo plano mientras se cargan los modelos
+    executor = ThreadPoolExecutor(max_workers=2)
+    source_future = executor.submit(cv2.imread, args.source)
+    target_future = executor.submit(cv2.imread, args.target)
+    executor.shutdown(wait=False)
+    
     # Iniciar aplicación
+    app = None
     try:
         logger.info("Iniciando FaceSwapPro en modo línea de comandos...")
         app = FaceSwapApp(model_path, data_dir, output_dir)
@@ -102,7 +111,11 @@ def main():
         
         # Procesar intercambio de rostros
         logger.info(f"Procesando intercambio con calidad {args.quality}...")
-        result_path = app.process_face_swap(args.source, args.target, args.quality)
+        result_path = app.process_face_swap(
+            args.source, args.target, args.quality,
+            source_img=source_future.result(),
+            target_img=target_future.result()
+        )
         
         if not result_path:
             logger.error("No se pudo completar el intercambio de rostros.")
@@ -110,9 +123,8 @@ def main():
         
         # Si se especificó una ruta de salida, copiar el resultado
         if args.output:
-            import shutil
             try:
-                shutil.copy2(result_path, args.output)
+                fast_copy(result_path, args.output)
                 logger.info(f"Resultado guardado en: {args.output}")
             except Exception as e:
                 logger.error(f"Error al guardar resultado: {e}")
@@ -126,6 +138,10 @@ def main():
     except Exception as e:
         logger.error(f"Error durante la ejecución: {e}")
         return 1
+    
+    finally:
+        if app is not None:
+            app.close()
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
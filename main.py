@@ -18,15 +18,14 @@ def main():
     Función principal que inicia la aplicación FaceSwapPro.
     """
     # Configuración de rutas
-    base_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.abspath(__file__).rpartition(os.sep)[0]
     models_dir = os.path.join(base_dir, "models")
     data_dir = os.path.join(base_dir, "data")
     output_dir = os.path.join(base_dir, "output")
     
     # Crear directorios si no existen
     for directory in [models_dir, data_dir, output_dir]:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)
     
     # Modelo a utilizar
     model_path = os.path.join(models_dir, "inswapper_128.onnx")
@@ -8,11 +8,53 @@ Este módulo contiene la clase FaceDetector que se encarga de
 detectar rostros en imágenes utilizando InsightFace.
 """
 
+import glob
 import logging
+import os
 import insightface
 from insightface.app import FaceAnalysis
+from insightface.model_zoo.model_zoo import ModelRouter
+from insightface.utils import ensure_available
 import numpy as np
 import cv2
+import onnxruntime as ort
+from .onnx_session import create_session_options, get_execution_providers
+
+# Caché de modelos FaceAnalysis ya preparados, indexada por (nombre, det_size, ctx_id)
+_APP_CACHE = {}
+
+class _OptimizedFaceAnalysis(FaceAnalysis):
+    """
+    FaceAnalysis que crea las sesiones de sus submodelos con opciones optimizadas.
+    
+    `FaceAnalysis` crea cada sesión sin `SessionOptions`; aquí se crean una
+    sola vez con `create_session_options`, en lugar de reconstruirlas después.
+    """
+    
+    def __init__(self, name, providers, root='~/.insightface'):
+        """
+        Carga los submodelos del paquete indicado.
+        
+        Args:
+            name (str): Nombre del paquete de modelos.
+            providers (list): Proveedores de ejecución de ONNX Runtime.
+            root (str, opcional): Directorio raíz de los modelos de InsightFace.
+        """
+        ort.set_default_logger_severity(3)
+        self.models = {}
+        self.model_dir = ensure_available('models', name, root=root)
+        
+        for onnx_file in sorted(glob.glob(os.path.join(self.model_dir, '*.onnx'))):
+            model = ModelRouter(onnx_file).get_model(
+                sess_options=create_session_options(), providers=providers
+            )
+            # Igual que FaceAnalysis: un modelo por tarea, ignorando los no reconocidos
+            if model is not None and model.taskname not in self.models:
+                self.models[model.taskname] = model
+        
+        if 'detection' not in self.models:
+            raise RuntimeError(f"No se encontró un modelo de detección en {self.model_dir}")
+        self.det_model = self.models['detection']
 
 class FaceDetector:
     """
@@ -36,23 +78,46 @@ class FaceDetector:
         assert insightface.__version__ >= '0.7', "Se requiere InsightFace versión 0.7 o superior"
         
         try:
-            # Inicializar el detector de rostros de InsightFace
-            self.app = FaceAnalysis(name='buffalo_l')
-            self.app.prepare(ctx_id=0, det_size=det_size)
+            # Reutilizar el detector de InsightFace si ya se preparó en este proceso
+            key = ('buffalo_l', tuple(det_size), 0)
+            self.app = _APP_CACHE.get(key)
+            if self.app is None:
+                self.app = _APP_CACHE.setdefault(key, self._build_app(*key))
             self.logger.info("Detector de rostros inicializado correctamente")
         except Exception as e:
             self.logger.error(f"Error al inicializar el detector de rostros: {e}")
             raise
     
-    def detect_faces(self, image):
+    @staticmethod
+    def _build_app(name, det_size, ctx_id):
+        """
+        Crea y prepara un modelo FaceAnalysis de InsightFace.
+        
+        Args:
+            name (str): Nombre del paquete de modelos.
+            det_size (tuple): Tamaño del detector.
+            ctx_id (int): Identificador del dispositivo de ejecución.
+            
+        Returns:
+            FaceAnalysis: Modelo preparado para la detección.
+        """
+        providers = get_execution_providers()
+        app = _OptimizedFaceAnalysis(name, providers)
+        app.prepare(ctx_id=ctx_id, det_size=det_size)
+        return app
+    
+    def detect_faces(self, image, sort='x'):
         """
         Detecta rostros en una imagen.
         
         Args:
             image (numpy.ndarray): Imagen en formato OpenCV (BGR).
+            sort (str, opcional): Criterio de orden. 'x' ordena los rostros de
+                izquierda a derecha; None los devuelve en el orden del detector.
+                Por defecto es 'x'.
             
         Returns:
-            list: Lista de rostros detectados ordenados de izquierda a derecha.
+            list: Lista de rostros detectados (de izquierda a derecha si sort='x').
                  Cada rostro contiene información como bbox, landmarks, etc.
         """
         if image is None:
@@ -64,7 +129,10 @@ class FaceDetector:
             faces = self.app.get(image)
             
             # Ordenar rostros de izquierda a derecha
-            faces = sorted(faces, key=lambda x: x.bbox[0])
+            if sort == 'x' and len(faces) > 1:
+                xs = np.fromiter((face.bbox[0] for face in faces),
+                                 dtype=np.float32, count=len(faces))
+                faces = [faces[i] for i in np.argsort(xs, kind='stable')]
             
             self.logger.info(f"Se detectaron {len(faces)} rostros en la imagen")
             return faces
@@ -73,6 +141,22 @@ class FaceDetector:
             self.logger.error(f"Error al detectar rostros: {e}")
             return []
     
+    def detect_faces_batch(self, images, sort='x'):
+        """
+        Detecta rostros en varias imágenes.
+        
+        Args:
+            images (iterable): Imágenes en formato OpenCV (BGR), como una lista o
+                un array de forma (N, alto, ancho, 3).
+            sort (str, opcional): Criterio de orden de los rostros de cada imagen
+                (ver `detect_faces`). Por defecto es 'x'.
+            
+        Returns:
+            list: Una lista de rostros detectados por cada imagen, en el mismo orden.
+        """
+        # InsightFace procesa una imagen por llamada: cada una pasa por detect_faces
+        return [self.detect_faces(image, sort=sort) for image in images]
+    
     def get_largest_face(self, faces):
         """
         Obtiene el rostro más grande de una lista de rostros.
@@ -86,24 +170,27 @@ class FaceDetector:
         if not faces:
             return None
         
-        # Calcular el área de cada rostro y obtener el más grande
-        largest_face = max(faces, key=lambda face: 
-                          (face.bbox[2] - face.bbox[0]) * (face.bbox[3] - face.bbox[1]))
+        # Calcular el área de todos los rostros a la vez y obtener el más grande
+        bboxes = np.array([face.bbox for face in faces], dtype=np.float32)
+        areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+        largest_face = faces[int(areas.argmax())]
         
         return largest_face
     
-    def draw_face_landmarks(self, image, face):
+    def draw_face_landmarks(self, image, face, inplace=False):
         """
         Dibuja los puntos de referencia faciales en una imagen.
         
         Args:
             image (numpy.ndarray): Imagen en formato OpenCV.
             face (object): Rostro detectado con InsightFace.
+            inplace (bool, opcional): Si es True, dibuja directamente sobre `image`
+                sin copiarla. Por defecto es False.
             
         Returns:
             numpy.ndarray: Imagen con los puntos de referencia dibujados.
         """
-        img_with_landmarks = image.copy()
+        img_with_landmarks = image if inplace else image.copy()
         
         # Dibujar caja delimitadora
         bbox = face.bbox.astype(np.int32)
@@ -115,12 +202,14 @@ class FaceDetector:
         # Dibujar puntos de referencia faciales
         landmarks = face.landmark_2d_106
         if landmarks is not None:
-            for point in landmarks.astype(np.int32):
-                cv2.circle(img_with_landmarks, tuple(point), 1, (0, 0, 255), -1)
+            # Cada punto es un contorno cerrado de un solo vértice, que con grosor 2
+            # se dibuja como un punto de radio 1 en una única llamada
+            points = landmarks.astype(np.int32).reshape(-1, 1, 2)
+            cv2.polylines(img_with_landmarks, list(points), True, (0, 0, 255), 2)
         
         return img_with_landmarks
     
-    def crop_face(self, image, face, expand_ratio=1.5):
+    def crop_face(self, image, face, expand_ratio=1.5, copy=False):
         """
         Recorta un rostro de una imagen con un margen adicional.
         
@@ -128,6 +217,9 @@ class FaceDetector:
             image (numpy.ndarray): Imagen en formato OpenCV.
             face (object): Rostro detectado con InsightFace.
             expand_ratio (float, opcional): Ratio para expandir el recorte. Por defecto es 1.5.
+            copy (bool, opcional): Si es True, devuelve una copia independiente.
+                Por defecto es False y se devuelve una vista de `image`, por lo que
+                modificar el recorte modifica también la imagen original.
             
         Returns:
             numpy.ndarray: Imagen recortada con el rostro.
@@ -148,7 +240,9 @@ class FaceDetector:
         x2 = min(w, int(center_x + size_x / 2))
         y2 = min(h, int(center_y + size_y / 2))
         
-        # Recortar imagen
+        # Recortar imagen (vista sin copia salvo que se solicite)
         cropped = image[y1:y2, x1:x2]
+        if copy:
+            cropped = cropped.copy()
         
         return cropped
\ No newline at end of file
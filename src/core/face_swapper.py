@@ -10,9 +10,52 @@ realizar el intercambio de rostros utilizando InsightFace.
 
 import logging
 import os
-import insightface
+from insightface.model_zoo.inswapper import INSwapper
+from insightface.utils import face_align
 import cv2
 import numpy as np
+from .onnx_session import create_session, get_execution_providers
+
+# Caché de modelos de intercambio ya cargados, indexada por ruta del modelo
+_SWAPPER_CACHE = {}
+
+# Núcleo gaussiano 1D (25 elementos) precalculado para suavizar la máscara del rostro
+_GAUSS_K = cv2.getGaussianKernel(25, 0)
+
+def _ensure_quantized(model_path):
+    """
+    Obtiene la versión cuantizada a INT8 del modelo, generándola si no existe.
+    
+    Args:
+        model_path (str): Ruta al modelo de intercambio de rostros (ONNX).
+        
+    Returns:
+        str: Ruta al modelo cuantizado o None si no se pudo generar.
+    """
+    quantized_path = os.path.splitext(model_path)[0] + ".int8.onnx"
+    if os.path.exists(quantized_path):
+        return quantized_path
+    
+    logger = logging.getLogger('FaceSwapPro.FaceSwapper')
+    partial_path = quantized_path + ".part"
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        
+        # Cuantizar a un archivo temporal y renombrarlo al terminar: un proceso
+        # interrumpido nunca deja un modelo truncado con el nombre definitivo
+        logger.info("Cuantizando modelo de intercambio a INT8...")
+        quantize_dynamic(
+            model_path, partial_path,
+            weight_type=QuantType.QInt8,
+            op_types_to_quantize=['Conv', 'MatMul']
+        )
+        os.replace(partial_path, quantized_path)
+        return quantized_path
+    except Exception as e:
+        logger.warning(f"No se pudo cuantizar el modelo, se usará FP32: {e}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return None
 
 class FaceSwapper:
     """
@@ -37,14 +80,42 @@ class FaceSwapper:
             raise FileNotFoundError(f"No se encontró el modelo en: {model_path}")
         
         try:
-            # Cargar el modelo de intercambio de rostros
-            self.swapper = insightface.model_zoo.get_model(model_path)
+            # Cargar el modelo de intercambio de rostros (reutilizando el ya cargado)
+            key = os.path.abspath(model_path)
+            self.swapper = _SWAPPER_CACHE.get(key)
+            if self.swapper is None:
+                self.swapper = _SWAPPER_CACHE.setdefault(key, self._load_swapper(model_path))
             self.logger.info("Modelo de intercambio cargado correctamente")
         except Exception as e:
             self.logger.error(f"Error al cargar el modelo de intercambio: {e}")
             raise
     
-    def swap_face(self, target_img, target_face, source_img, source_face):
+    @staticmethod
+    def _load_swapper(model_path):
+        """
+        Carga el modelo de intercambio con una sesión de ONNX Runtime optimizada.
+        
+        Args:
+            model_path (str): Ruta al modelo de intercambio de rostros (ONNX).
+            
+        Returns:
+            object: Modelo de intercambio de InsightFace.
+        """
+        # Preferir TensorRT/CUDA si están disponibles, con caché junto al modelo
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(model_path)), "trt_cache")
+        providers = get_execution_providers(cache_dir)
+        
+        # En CPU, usar la versión INT8 del modelo si se puede generar. El modelo
+        # original se sigue usando para cargar la matriz de embedding (emap).
+        session_file = model_path
+        if providers == ['CPUExecutionProvider']:
+            session_file = _ensure_quantized(model_path) or model_path
+        
+        # Crear la sesión una sola vez, ya con las opciones optimizadas
+        session = create_session(session_file, providers)
+        return INSwapper(model_file=model_path, session=session)
+    
+    def swap_face(self, target_img, target_face, source_img, source_face, source_latent=None):
         """
         Intercambia un rostro de la imagen fuente a la imagen objetivo.
         
@@ -53,6 +124,8 @@ class FaceSwapper:
             target_face (object): Rostro detectado en la imagen objetivo.
             source_img (numpy.ndarray): Imagen fuente de donde se tomará el rostro.
             source_face (object): Rostro detectado en la imagen fuente.
+            source_latent (numpy.ndarray, opcional): Vector latente precalculado con
+                `prepare_source`. Por defecto se calcula a partir de `source_face`.
             
         Returns:
             numpy.ndarray: Imagen resultante con el rostro intercambiado.
@@ -60,17 +133,39 @@ class FaceSwapper:
         try:
             # Realizar intercambio de rostros
             self.logger.info("Realizando intercambio de rostros...")
-            result = target_img.copy()
-            result = self.swapper.get(result, target_face, source_face, paste_back=True)
+            if source_latent is None:
+                source_latent = self.prepare_source(source_face)
+            
+            # El pegado genera una imagen nueva sin modificar la imagen objetivo
+            result = self._swap_batch(target_img, [target_face], source_latent)
             
             self.logger.info("Intercambio de rostros completado exitosamente")
             return result
         
         except Exception as e:
             self.logger.error(f"Error al intercambiar rostros: {e}")
-            return target_img.copy()  # Devolver imagen original en caso de error
+            return target_img  # Devolver imagen original en caso de error
     
-    def swap_multiple_faces(self, target_img, target_faces, source_img, source_face):
+    def prepare_source(self, source_face):
+        """
+        Calcula el vector latente del rostro fuente para el modelo de intercambio.
+        
+        El resultado puede reutilizarse en varias llamadas a `swap_multiple_faces`
+        con el mismo rostro fuente.
+        
+        Args:
+            source_face (object): Rostro detectado en la imagen fuente.
+            
+        Returns:
+            numpy.ndarray: Vector latente normalizado con forma (1, 512).
+        """
+        latent = source_face.normed_embedding.reshape((1, -1))
+        latent = np.dot(latent, self.swapper.emap)
+        latent /= np.linalg.norm(latent)
+        return latent
+    
+    def swap_multiple_faces(self, target_img, target_faces, source_img, source_face,
+                            source_latent=None):
         """
         Intercambia un rostro de la imagen fuente a múltiples rostros en la imagen objetivo.
         
@@ -79,26 +174,129 @@ class FaceSwapper:
             target_faces (list): Lista de rostros detectados en la imagen objetivo.
             source_img (numpy.ndarray): Imagen fuente de donde se tomará el rostro.
             source_face (object): Rostro detectado en la imagen fuente.
+            source_latent (numpy.ndarray, opcional): Vector latente precalculado con
+                `prepare_source`. Por defecto se calcula a partir de `source_face`.
             
         Returns:
             numpy.ndarray: Imagen resultante con los rostros intercambiados.
         """
         try:
-            # Realizar intercambio de rostros para cada rostro detectado
+            # Realizar intercambio de todos los rostros con una sola inferencia
             self.logger.info(f"Realizando intercambio de {len(target_faces)} rostros...")
-            result = target_img.copy()
+            if not target_faces:
+                return target_img
+            
+            if source_latent is None:
+                source_latent = self.prepare_source(source_face)
             
-            for face in target_faces:
-                result = self.swapper.get(result, face, source_face, paste_back=True)
+            result = self._swap_batch(target_img, target_faces, source_latent)
             
             self.logger.info("Intercambio de múltiples rostros completado exitosamente")
             return result
         
         except Exception as e:
             self.logger.error(f"Error al intercambiar múltiples rostros: {e}")
-            return target_img.copy()  # Devolver imagen original en caso de error
+            return target_img  # Devolver imagen original en caso de error
+    
+    def _swap_batch(self, target_img, target_faces, source_latent):
+        """
+        Ejecuta el modelo de intercambio sobre varios rostros en un único lote.
+        
+        Alinea todos los rostros objetivo, los apila en un tensor (N, 3, 128, 128)
+        y realiza una sola llamada a la sesión de ONNX Runtime. Si el modelo tiene
+        un tamaño de lote fijo, se ejecuta una inferencia por rostro.
+        
+        Args:
+            target_img (numpy.ndarray): Imagen objetivo donde se colocarán los rostros.
+            target_faces (list): Lista de rostros detectados en la imagen objetivo.
+            source_latent (numpy.ndarray): Vector latente del rostro fuente.
+            
+        Returns:
+            numpy.ndarray: Imagen resultante con los rostros intercambiados.
+        """
+        swapper = self.swapper
+        session = swapper.session
+        size = swapper.input_size[0]
+        num_faces = len(target_faces)
+        
+        # Alinear todos los rostros objetivo en un búfer preasignado
+        aligned = np.empty((num_faces, size, size, 3), dtype=np.uint8)
+        matrices = []
+        for i, face in enumerate(target_faces):
+            aligned[i], M = face_align.norm_crop2(target_img, face.kps, size)
+            matrices.append(M)
+        
+        blob = cv2.dnn.blobFromImages(
+            list(aligned), 1.0 / swapper.input_std, swapper.input_size,
+            (swapper.input_mean, swapper.input_mean, swapper.input_mean), swapRB=True
+        )
+        
+        target_name, source_name = swapper.input_names[0], swapper.input_names[1]
+        batch_dim = session.get_inputs()[0].shape[0]
+        if isinstance(batch_dim, int) and batch_dim == 1:
+            preds = np.concatenate([
+                session.run(swapper.output_names,
+                            {target_name: blob[i:i + 1], source_name: source_latent})[0]
+                for i in range(num_faces)
+            ])
+        else:
+            latents = np.repeat(source_latent, num_faces, axis=0)
+            preds = session.run(swapper.output_names,
+                                {target_name: blob, source_name: latents})[0]
+        
+        # Convertir las salidas a imágenes BGR de 8 bits
+        fakes = np.clip(255 * preds.transpose((0, 2, 3, 1)), 0, 255).astype(np.uint8)
+        fakes = np.ascontiguousarray(fakes[..., ::-1])
+        
+        # Pegar cada rostro generado en la imagen objetivo
+        result = target_img
+        for aimg, bgr_fake, M in zip(aligned, fakes, matrices):
+            result = self._paste_back(result, aimg, bgr_fake, M)
+        
+        return result
+    
+    def _paste_back(self, target_img, aimg, bgr_fake, M):
+        """
+        Pega un rostro generado en la imagen objetivo con una máscara suavizada.
+        
+        Reproduce el pegado de `INSwapper.get(..., paste_back=True)` de InsightFace.
+        
+        Args:
+            target_img (numpy.ndarray): Imagen donde se pegará el rostro.
+            aimg (numpy.ndarray): Rostro objetivo alineado.
+            bgr_fake (numpy.ndarray): Rostro generado por el modelo (BGR).
+            M (numpy.ndarray): Matriz afín usada para alinear el rostro.
+            
+        Returns:
+            numpy.ndarray: Nueva imagen con el rostro pegado.
+        """
+        h, w = target_img.shape[:2]
+        
+        # Llevar rostro y máscara al espacio de la imagen objetivo
+        IM = cv2.invertAffineTransform(M)
+        img_white = np.full(aimg.shape[:2], 255, dtype=np.float32)
+        bgr_fake = cv2.warpAffine(bgr_fake, IM, (w, h), borderValue=0.0)
+        img_white = cv2.warpAffine(img_white, IM, (w, h), borderValue=0.0)
+        img_white[img_white > 20] = 255
+        
+        # Erosionar y difuminar la máscara según el tamaño del rostro
+        img_mask = img_white
+        mask_h_inds, mask_w_inds = np.where(img_mask == 255)
+        mask_h = np.max(mask_h_inds) - np.min(mask_h_inds)
+        mask_w = np.max(mask_w_inds) - np.min(mask_w_inds)
+        mask_size = int(np.sqrt(mask_h * mask_w))
+        
+        k = max(mask_size // 10, 10)
+        img_mask = cv2.erode(img_mask, np.ones((k, k), np.uint8), iterations=1)
+        k = max(mask_size // 20, 5)
+        img_mask = cv2.GaussianBlur(img_mask, (2 * k + 1, 2 * k + 1), 0)
+        img_mask /= 255
+        
+        # Combinar rostro generado e imagen objetivo en una sola pasada
+        return cv2.blendLinear(bgr_fake, target_img, img_mask, 1.0 - img_mask)
     
-    def adjust_face_boundary(self, result, target_img, face_bbox, blend_ratio=0.5):
+    def adjust_face_boundary(self, result, target_img, face_bbox, blend_ratio=0.5,
+                             seamless=False):
         """
         Ajusta los bordes del rostro intercambiado para una mejor fusión.
         
@@ -107,6 +305,8 @@ class FaceSwapper:
             target_img (numpy.ndarray): Imagen objetivo original.
             face_bbox (numpy.ndarray): Caja delimitadora del rostro.
             blend_ratio (float, opcional): Ratio de fusión. Por defecto es 0.5.
+            seamless (bool, opcional): Si es True, usa clonación de Poisson
+                (cv2.seamlessClone) en lugar de la fusión lineal. Por defecto es False.
             
         Returns:
             numpy.ndarray: Imagen con los bordes del rostro ajustados.
@@ -114,22 +314,44 @@ class FaceSwapper:
         # Convertir bbox a enteros
         x1, y1, x2, y2 = [int(coord) for coord in face_bbox]
         
-        # Crear una máscara para la región del rostro
-        mask = np.zeros_like(result, dtype=np.float32)
-        cv2.rectangle(mask, (x1, y1), (x2, y2), (1, 1, 1), -1)
+        if seamless:
+            return self._seamless_boundary(result, target_img, x1, y1, x2, y2)
+        
+        # Crear una máscara de un solo canal para la región del rostro
+        mask = np.zeros(result.shape[:2], dtype=np.float32)
+        cv2.rectangle(mask, (x1, y1), (x2, y2), 1.0, -1)
         
         # Difuminar la máscara para una transición suave
-        mask = cv2.GaussianBlur(mask, (25, 25), 0)
+        mask = cv2.sepFilter2D(mask, -1, _GAUSS_K, _GAUSS_K)
         
-        # Combinar la imagen original y el resultado usando la máscara
-        blended = cv2.addWeighted(
-            result.astype(np.float32), blend_ratio,
-            target_img.astype(np.float32), 1 - blend_ratio,
-            0
-        )
+        # Combinar el resultado y la imagen original usando la máscara
+        final_result = cv2.blendLinear(result, target_img, mask, 1.0 - mask)
+        
+        return final_result
+    
+    def _seamless_boundary(self, result, target_img, x1, y1, x2, y2):
+        """
+        Fusiona la región del rostro con cv2.seamlessClone.
+        
+        Args:
+            result (numpy.ndarray): Imagen con el rostro intercambiado.
+            target_img (numpy.ndarray): Imagen objetivo original.
+            x1, y1, x2, y2 (int): Coordenadas de la caja delimitadora del rostro.
+            
+        Returns:
+            numpy.ndarray: Imagen con los bordes del rostro ajustados.
+        """
+        h, w = result.shape[:2]
+        
+        # Mantener la máscara dentro de la imagen con un margen de un píxel
+        x1, x2 = max(1, x1), min(w - 2, x2)
+        y1, y2 = max(1, y1), min(h - 2, y2)
+        if x2 <= x1 or y2 <= y1:
+            return result
         
-        # Aplicar la máscara
-        final_result = result.copy()
-        final_result = result * mask + target_img * (1 - mask)
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.rectangle(mask, (x1, y1), (x2, y2), 255, -1)
         
-        return final_result.astype(np.uint8)
\ No newline at end of file
+        # El centro corresponde al centro de la caja para que el rostro no se desplace
+        center = ((x1 + x2 + 1) // 2, (y1 + y2 + 1) // 2)
+        return cv2.seamlessClone(result, target_img, mask, center, cv2.NORMAL_CLONE)
\ No newline at end of file
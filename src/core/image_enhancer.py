@@ -10,9 +10,46 @@ utilizando diversas técnicas de procesamiento de imágenes.
 """
 
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
+
+# Núcleo de suavizado equivalente a ImageFilter.SMOOTH de PIL
+_SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13.0
+
+# Parámetros del suavizado de piel: radio espacial del antiguo bilateral (d=9)
+# y sigma de color 75 normalizado al rango [0, 1]
+_SKIN_SIGMA_S = 4.5
+_SKIN_SIGMA_R = 75 / 255.0
+
+# Clasificador Haar usado cuando no se dispone de YuNet
+_HAAR_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# Lado mínimo (en píxeles de la imagen original) de los rostros del clasificador Haar
+_HAAR_MIN_FACE = 40
+
+# Lado máximo (en píxeles) de la imagen usada para detectar rostros
+_DETECTION_MAX_SIZE = 640.0
+
+# Códigos de conversión entre los espacios de color de las etapas de mejora
+_COLOR_CONVERSIONS = {
+    ('BGR', 'LAB'): cv2.COLOR_BGR2LAB,
+    ('LAB', 'BGR'): cv2.COLOR_LAB2BGR,
+    ('BGR', 'HSV'): cv2.COLOR_BGR2HSV,
+    ('HSV', 'BGR'): cv2.COLOR_HSV2BGR,
+}
+
+# Hilos compartidos por todos los mejoradores para procesar varios rostros en
+# paralelo. Es limitado para no sobresuscribir la CPU cuando se procesan varias
+# imágenes a la vez (lotes) junto con los hilos de ONNX Runtime
+_ROI_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                               thread_name_prefix='enhancer')
+
+# Ejecutar los filtros globales con OpenCL (UMat); desactivado por defecto
+# porque algunos controladores dan resultados incorrectos
+_USE_OPENCL = os.environ.get('FSP_USE_OCL') == '1'
 
 class ImageEnhancer:
     """
@@ -22,21 +59,59 @@ class ImageEnhancer:
     la calidad y el realismo de los rostros intercambiados.
     """
     
-    def __init__(self):
+    def __init__(self, yunet_model_path=None):
         """
         Inicializa el mejorador de imágenes.
+        
+        Args:
+            yunet_model_path (str, opcional): Ruta al modelo ONNX del detector YuNet.
+                Si no existe, se usa el clasificador Haar de OpenCV.
         """
         self.logger = logging.getLogger('FaceSwapPro.ImageEnhancer')
         self.logger.info("Inicializando mejorador de imágenes...")
         
-        # Cargar clasificador de rostros para mejoras específicas
+        # Cargar detector de rostros para mejoras específicas
         try:
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
+            # Objetos de OpenCV con estado interno (CLAHE, clasificador Haar) y
+            # búferes de trabajo: uno por hilo, ya que no pueden compartirse
+            self._local = threading.local()
+            self._yunet = None
+            self.face_cascade = None
+            
+            if (yunet_model_path and os.path.exists(yunet_model_path)
+                    and hasattr(cv2, 'FaceDetectorYN')):
+                # Detector YuNet (CNN multihilo con el backend DNN de OpenCV)
+                self._yunet = cv2.FaceDetectorYN.create(
+                    yunet_model_path, '', (320, 320), 0.7, 0.3, 5000
+                )
+                self.logger.info("Usando detector de rostros YuNet")
+            else:
+                self.face_cascade = self._get_cascade()
+            # Objetos reutilizables entre llamadas
+            self._yunet_lock = threading.Lock()
+            self._sharpen_kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]],
+                                            dtype=np.float32)
+            
+            # Efecto HDR en GPU si OpenCV está compilado con CUDA
+            self._use_cuda = (hasattr(cv2, 'cuda')
+                              and cv2.cuda.getCudaEnabledDeviceCount() > 0)
+            if self._use_cuda:
+                self._cuda_lock = threading.Lock()
+                self._cuda_clahe = cv2.cuda.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+                # Tabla HSV que solo suma 10 (saturado) al canal S
+                sat_lut = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+                sat_lut[:, 1] = np.minimum(np.arange(256) + 10, 255)
+                self._cuda_sat_lut = cv2.cuda.createLookUpTable(sat_lut.reshape(1, 256, 3))
+                self.logger.info("Usando CUDA para el efecto HDR")
+            
+            # Filtros globales con OpenCL mediante cv2.UMat (opcional)
+            self._use_ocl = _USE_OPENCL and cv2.ocl.haveOpenCL()
+            if self._use_ocl:
+                cv2.ocl.setUseOpenCL(True)
+                self.logger.info("Usando OpenCL para las mejoras globales")
             self.logger.info("Mejorador de imágenes inicializado correctamente")
         except Exception as e:
-            self.logger.error(f"Error al cargar el clasificador de rostros: {e}")
+            self.logger.error(f"Error al cargar el detector de rostros: {e}")
             raise
     
     def enhance_basic(self, image):
@@ -51,33 +126,104 @@ class ImageEnhancer:
         """
         self.logger.info("Aplicando mejoras básicas a la imagen...")
         
-        # Convertir a RGB para PIL
-        img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img_rgb)
+        image = self._to_device(image)
         
-        # Mejorar nitidez
-        enhancer = ImageEnhance.Sharpness(pil_img)
-        pil_img = enhancer.enhance(1.3)
+        # Mejorar nitidez: mezcla con la versión suavizada (como ImageEnhance.Sharpness)
+        smooth = cv2.filter2D(image, -1, _SMOOTH_KERNEL)
+        enhanced_img = cv2.addWeighted(image, 1.3, smooth, -0.3, 0)
         
-        # Mejorar contraste
-        enhancer = ImageEnhance.Contrast(pil_img)
-        pil_img = enhancer.enhance(1.1)
+        # Mejorar contraste respecto al gris medio con una LUT (como ImageEnhance.Contrast)
+        b_mean, g_mean, r_mean = cv2.mean(enhanced_img)[:3]
+        gray_mean = int(0.299 * r_mean + 0.587 * g_mean + 0.114 * b_mean + 0.5)
+        lut = np.clip(gray_mean + 1.1 * (np.arange(256) - gray_mean), 0, 255).astype(np.uint8)
+        enhanced_img = cv2.LUT(enhanced_img, lut)
         
-        # Mejorar color
-        enhancer = ImageEnhance.Color(pil_img)
-        pil_img = enhancer.enhance(1.1)
+        # Mejorar color respecto a la versión en grises (como ImageEnhance.Color)
+        gray = cv2.cvtColor(cv2.cvtColor(enhanced_img, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+        enhanced_img = cv2.addWeighted(enhanced_img, 1.1, gray, -0.1, 0)
         
-        # Convertir de vuelta a BGR para OpenCV
-        enhanced_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        return self._from_device(enhanced_img)
+    
+    def _to_device(self, image):
+        """
+        Envuelve la imagen en un `cv2.UMat` si OpenCL está activado.
         
-        return enhanced_img
+        Args:
+            image (numpy.ndarray): Imagen en formato OpenCV.
+            
+        Returns:
+            numpy.ndarray o cv2.UMat: Imagen lista para las funciones de OpenCV.
+        """
+        return cv2.UMat(image) if self._use_ocl else image
     
-    def enhance_skin(self, image):
+    @staticmethod
+    def _from_device(image):
+        """
+        Descarga la imagen a un array de NumPy si está en un `cv2.UMat`.
+        
+        Args:
+            image (numpy.ndarray o cv2.UMat): Imagen resultante.
+            
+        Returns:
+            numpy.ndarray: Imagen en memoria de la CPU.
+        """
+        return image.get() if isinstance(image, cv2.UMat) else image
+    
+    def _detect_faces(self, image):
+        """
+        Detecta rostros con YuNet o, si no está disponible, con el clasificador Haar.
+        
+        Args:
+            image (numpy.ndarray): Imagen en formato OpenCV (BGR).
+            
+        Returns:
+            list: Rectángulos (x, y, w, h) de los rostros detectados.
+        """
+        img_h, img_w = image.shape[:2]
+        
+        # Detectar sobre una versión reducida: el coste crece con el número de píxeles
+        scale = max(1.0, max(img_h, img_w) / _DETECTION_MAX_SIZE)
+        if scale > 1.0:
+            small = cv2.resize(image, None, fx=1 / scale, fy=1 / scale,
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = image
+        
+        if self._yunet is None:
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            cascade = self._get_cascade()
+            # Tamaño mínimo de 40 px en la imagen original, llevado a la reducida y
+            # sin bajar de la ventana del clasificador (su mínimo por defecto)
+            win_w, win_h = cascade.getOriginalWindowSize()
+            min_side = int(_HAAR_MIN_FACE / scale)
+            boxes = cascade.detectMultiScale(gray, 1.3, 5,
+                                             minSize=(max(win_w, min_side),
+                                                      max(win_h, min_side)))
+        else:
+            small_h, small_w = small.shape[:2]
+            with self._yunet_lock:
+                # El detector guarda el tamaño de entrada: no puede usarse en paralelo
+                self._yunet.setInputSize((small_w, small_h))
+                _, detections = self._yunet.detect(small)
+            boxes = [] if detections is None else detections[:, :4]
+        
+        # Escalar a la imagen original y recortar a sus límites
+        faces = []
+        for x, y, w, h in boxes:
+            x1, y1 = max(0, int(x * scale)), max(0, int(y * scale))
+            x2, y2 = min(img_w, int((x + w) * scale)), min(img_h, int((y + h) * scale))
+            if x2 > x1 and y2 > y1:
+                faces.append((x1, y1, x2 - x1, y2 - y1))
+        return faces
+    
+    def enhance_skin(self, image, faces=None):
         """
         Mejora específicamente la textura de la piel.
         
         Args:
             image (numpy.ndarray): Imagen en formato OpenCV (BGR).
+            faces (list, opcional): Rostros (x, y, w, h) ya detectados. Si no se
+                proporcionan, se detectan en la imagen.
             
         Returns:
             numpy.ndarray: Imagen con piel mejorada.
@@ -85,39 +231,58 @@ class ImageEnhancer:
         self.logger.info("Mejorando textura de piel...")
         
         # Detectar rostros
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        if faces is None:
+            faces = self._detect_faces(image)
         
         if len(faces) == 0:
             return image
         
         result = image.copy()
         
-        for (x, y, w, h) in faces:
-            # Extraer región del rostro
-            face_roi = result[y:y+h, x:x+w]
-            
-            # Aplicar filtro bilateral para suavizar la piel preservando bordes
-            face_roi = cv2.bilateralFilter(face_roi, 9, 75, 75)
-            
-            # Aplicar suavizado gaussiano ligero
-            face_roi = cv2.GaussianBlur(face_roi, (5, 5), 0)
-            
-            # Aplicar filtro de mejora de detalles
-            kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-            face_roi = cv2.filter2D(face_roi, -1, kernel)
-            
+        if len(faces) == 1:
+            # Un solo rostro: procesar directamente sin pasar por el pool de hilos
+            (x, y, w, h), = faces
+            result[y:y+h, x:x+w] = self._enhance_skin_roi(image[y:y+h, x:x+w])
+            return result
+        
+        # Varios rostros: procesar cada región en paralelo (OpenCV libera el GIL)
+        futures = [
+            (x, y, w, h, _ROI_POOL.submit(self._enhance_skin_roi, image[y:y+h, x:x+w]))
+            for (x, y, w, h) in faces
+        ]
+        
+        for x, y, w, h, future in futures:
             # Colocar el rostro mejorado de vuelta en la imagen
-            result[y:y+h, x:x+w] = face_roi
+            result[y:y+h, x:x+w] = future.result()
         
         return result
     
-    def enhance_facial_features(self, image):
+    def _enhance_skin_roi(self, face_roi):
+        """
+        Suaviza la piel y realza detalles en una región de rostro.
+        
+        Args:
+            face_roi (numpy.ndarray): Región del rostro en formato OpenCV (BGR).
+            
+        Returns:
+            numpy.ndarray: Región del rostro mejorada.
+        """
+        # Suavizar la piel preservando bordes con el filtro recursivo de dominio
+        # (aproximación O(1) del filtro bilateral de diámetro 9 y sigma 75)
+        face_roi = cv2.edgePreservingFilter(face_roi, flags=cv2.RECURS_FILTER,
+                                            sigma_s=_SKIN_SIGMA_S, sigma_r=_SKIN_SIGMA_R)
+        
+        # Aplicar filtro de mejora de detalles
+        return cv2.filter2D(face_roi, -1, self._sharpen_kernel)
+    
+    def enhance_facial_features(self, image, faces=None):
         """
         Mejora características faciales específicas como ojos y labios.
         
         Args:
             image (numpy.ndarray): Imagen en formato OpenCV (BGR).
+            faces (list, opcional): Rostros (x, y, w, h) ya detectados. Si no se
+                proporcionan, se detectan en la imagen.
             
         Returns:
             numpy.ndarray: Imagen con características faciales mejoradas.
@@ -125,8 +290,8 @@ class ImageEnhancer:
         self.logger.info("Mejorando características faciales...")
         
         # Detectar rostros
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        if faces is None:
+            faces = self._detect_faces(image)
         
         if len(faces) == 0:
             return image
@@ -135,10 +300,29 @@ class ImageEnhancer:
         hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
         h, s, v = cv2.split(hsv)
         
-        # Asegurarse que los canales son del tipo correcto
-        h = h.astype(np.uint8)
-        s = s.astype(np.uint8)
-        v = v.astype(np.uint8)
+        # Aumentar saturación de ojos y labios
+        self._boost_features_saturation(s, faces)
+        
+        # Unir canales y convertir de vuelta a BGR
+        hsv_realzado = cv2.merge([h, s, v])
+        imagen_realzada = cv2.cvtColor(hsv_realzado, cv2.COLOR_HSV2BGR)
+        
+        return imagen_realzada
+    
+    def _boost_features_saturation(self, s, faces, s_bump=None):
+        """
+        Aumenta la saturación en las regiones aproximadas de ojos y labios.
+        
+        Args:
+            s (numpy.ndarray): Canal de saturación (HSV), modificado en el lugar.
+            faces (list): Rostros (x, y, w, h) detectados.
+            s_bump (numpy.ndarray, opcional): Búfer de trabajo de la misma forma que `s`.
+        """
+        # Acumular los incrementos de todos los rostros en una única imagen
+        if s_bump is None:
+            s_bump = np.zeros_like(s)
+        else:
+            s_bump.fill(0)
         
         # Para cada rostro
         for (x, y, w, h_height) in faces:
@@ -158,21 +342,14 @@ class ImageEnhancer:
             
             if eye_y + eye_h <= s.shape[0] and x + w <= s.shape[1]:
                 # Aumentar saturación en ojos
-                eye_region = s[eye_y:eye_y+eye_h, x:x+w].copy()
-                eye_region = np.clip(eye_region.astype(np.int16) + 10, 0, 255).astype(np.uint8)
-                s[eye_y:eye_y+eye_h, x:x+w] = eye_region
+                s_bump[eye_y:eye_y+eye_h, x:x+w] += 10
             
             if lip_y + lip_h <= s.shape[0] and x + w <= s.shape[1]:
                 # Aumentar saturación en labios
-                lip_region = s[lip_y:lip_y+lip_h, x:x+w].copy()
-                lip_region = np.clip(lip_region.astype(np.int16) + 20, 0, 255).astype(np.uint8)
-                s[lip_y:lip_y+lip_h, x:x+w] = lip_region
-        
-        # Unir canales y convertir de vuelta a BGR
-        hsv_realzado = cv2.merge([h, s, v])
-        imagen_realzada = cv2.cvtColor(hsv_realzado, cv2.COLOR_HSV2BGR)
+                s_bump[lip_y:lip_y+lip_h, x:x+w] += 20
         
-        return imagen_realzada
+        # Suma con saturación de uint8 sobre el propio canal
+        cv2.add(s, s_bump, dst=s)
     
     def enhance_color_correction(self, result_img, target_img, source_img):
         """
@@ -189,25 +366,23 @@ class ImageEnhancer:
         self.logger.info("Aplicando corrección de color...")
         
         # Obtener la media de color de las imágenes
-        mean_origen = cv2.mean(source_img)[:3]
-        mean_destino = cv2.mean(target_img)[:3]
-        
-        # Calcular factores de corrección
-        ratios = [d/o if o > 0 else 1.0 for o, d in zip(mean_origen, mean_destino)]
+        mean_origen = np.array(cv2.mean(source_img)[:3])
+        mean_destino = np.array(cv2.mean(target_img)[:3])
         
-        # Aplicar corrección de color
-        canales = cv2.split(result_img)
-        canales_corregidos = []
+        # Calcular factores de corrección (1.0 en canales sin información de origen)
+        ratios = np.divide(mean_destino, mean_origen, out=np.ones(3), where=mean_origen > 0)
         
-        for i, canal in enumerate(canales[:3]):
-            corregido = canal * (ratios[i] * 0.7 + 0.3)  # Mezcla para no sobrecorregir
-            corregido = np.clip(corregido, 0, 255).astype(np.uint8)
-            canales_corregidos.append(corregido)
+        # Factores por canal mezclados para no sobrecorregir
+        escala = ratios * 0.7 + 0.3
         
-        if len(canales) > 3:  # Si hay canal alfa
-            canales_corregidos.append(canales[3])
+        # Tabla de 256 entradas por canal; el alfa, si existe, se mantiene igual
+        tabla = np.arange(256)[:, np.newaxis] * escala
+        tabla = np.clip(tabla, 0, 255).astype(np.uint8)
+        if result_img.ndim == 3 and result_img.shape[2] > 3:
+            tabla = np.hstack([tabla, np.arange(256, dtype=np.uint8)[:, None]])
         
-        resultado_corregido = cv2.merge(canales_corregidos)
+        # Aplicar corrección de color a todos los canales en una sola pasada
+        resultado_corregido = cv2.LUT(result_img, tabla.reshape(1, 256, -1))
         return resultado_corregido
     
     def enhance_hdr_effect(self, image):
@@ -222,13 +397,17 @@ class ImageEnhancer:
         """
         self.logger.info("Aplicando efecto HDR...")
         
+        if self._use_cuda:
+            return self._enhance_hdr_cuda(image)
+        
+        image = self._to_device(image)
+        
         # Convertir a espacio de color LAB para manipular contraste sin afectar color
         lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
         l, a, b = cv2.split(lab)
         
         # Aplicar CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
+        l = self._get_clahe().apply(l)
         
         # Fusionar canales nuevamente
         lab = cv2.merge((l, a, b))
@@ -243,7 +422,38 @@ class ImageEnhancer:
         hsv = cv2.merge((h, s, v))
         imagen_hdr = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
         
-        return imagen_hdr
+        return self._from_device(imagen_hdr)
+    
+    def _enhance_hdr_cuda(self, image):
+        """
+        Aplica el efecto HDR en la GPU con los módulos CUDA de OpenCV.
+        
+        La imagen se sube una sola vez y se descarga al final, de modo que
+        las conversiones de color, el CLAHE y la saturación no salen del dispositivo.
+        
+        Args:
+            image (numpy.ndarray): Imagen en formato OpenCV (BGR).
+            
+        Returns:
+            numpy.ndarray: Imagen con efecto HDR.
+        """
+        # El CLAHE de CUDA guarda búferes internos: no puede usarse en paralelo
+        with self._cuda_lock:
+            gpu_img = cv2.cuda_GpuMat()
+            gpu_img.upload(image)
+            
+            # CLAHE sobre la luminancia en espacio LAB
+            lab = cv2.cuda.cvtColor(gpu_img, cv2.COLOR_BGR2LAB)
+            l, a, b = cv2.cuda.split(lab)
+            l = self._cuda_clahe.apply(l, cv2.cuda.Stream_Null())
+            lab = cv2.cuda.merge((l, a, b))
+            
+            # Aumentar saturación con una tabla sobre la imagen HSV
+            hsv = cv2.cuda.cvtColor(cv2.cuda.cvtColor(lab, cv2.COLOR_LAB2BGR),
+                                    cv2.COLOR_BGR2HSV)
+            hsv = self._cuda_sat_lut.transform(hsv)
+            
+            return cv2.cuda.cvtColor(hsv, cv2.COLOR_HSV2BGR).download()
     
     def apply_all_enhancements(self, image, level=3):
         """
@@ -258,10 +468,8 @@ class ImageEnhancer:
         """
         self.logger.info(f"Aplicando todas las mejoras (nivel {level})...")
         
-        result = image.copy()
-        
-        # Nivel 1: Mejoras básicas
-        result = self.enhance_basic(result)
+        # Nivel 1: Mejoras básicas (devuelve una imagen nueva; la entrada no se modifica)
+        result = self.enhance_basic(image)
         
         if level >= 2:
             # Nivel 2: Mejoras de piel y características faciales
@@ -272,4 +480,214 @@ class ImageEnhancer:
             # Nivel 3: Efecto HDR
             result = self.enhance_hdr_effect(result)
         
-        return result
\ No newline at end of file
+        return result
+    
+    def apply_all_fused(self, image, level=3, target_img=None, source_img=None):
+        """
+        Aplica las mejoras del nivel indicado reduciendo las conversiones de color.
+        
+        Aplica las mismas mejoras y en el mismo orden que `apply_all_enhancements`
+        (con la corrección de color antes del HDR si se indican las imágenes de
+        referencia), pero detecta los rostros una sola vez, antes de mejorar la
+        piel, y reutiliza los búferes de trabajo en las conversiones de color.
+        
+        Args:
+            image (numpy.ndarray): Imagen en formato OpenCV (BGR).
+            level (int, opcional): Nivel de mejora (1-3). Por defecto es 3.
+            target_img (numpy.ndarray, opcional): Imagen objetivo original. Junto con
+                `source_img`, activa la corrección de color en el nivel 3.
+            source_img (numpy.ndarray, opcional): Imagen fuente original.
+            
+        Returns:
+            numpy.ndarray: Imagen mejorada.
+        """
+        self.logger.info(f"Aplicando mejoras combinadas (nivel {level})...")
+        
+        context = {'faces': [], 'target_img': target_img, 'source_img': source_img}
+        result, space = image, 'BGR'
+        
+        color_correction = target_img is not None and source_img is not None
+        for stage_space, stage, condition in self._plan_stages(level, color_correction):
+            if condition is not None and not condition(context):
+                continue
+            if stage_space != space:
+                result = self._convert_space(result, space, stage_space)
+                space = stage_space
+            result = stage(result, context)
+        
+        # La salida final se asigna nueva para no devolver un búfer compartido
+        if space != 'BGR':
+            result = self._convert_space(result, space, 'BGR')
+        
+        return result
+    
+    def _plan_stages(self, level, color_correction=False):
+        """
+        Obtiene las etapas de mejora del nivel indicado en orden de ejecución.
+        
+        El orden es el de la cadena secuencial: mejoras básicas, piel, ojos y
+        labios, corrección de color y HDR (CLAHE sobre la luminancia y aumento de
+        saturación). Con CUDA, el HDR se ejecuta entero en la GPU.
+        
+        Args:
+            level (int): Nivel de mejora (1-3).
+            color_correction (bool, opcional): Si es True, el nivel 3 incluye la
+                corrección de color. Por defecto es False.
+            
+        Returns:
+            list: Tuplas (espacio de color, etapa, condición opcional).
+        """
+        stages = [('BGR', self._stage_basic, None)]
+        
+        if level >= 2:
+            stages.append(('BGR', self._stage_skin, None))
+            # Sin rostros la etapa no cambia nada: se evita la conversión
+            stages.append(('HSV', self._stage_features, lambda ctx: len(ctx['faces']) > 0))
+        
+        if level >= 3:
+            if color_correction:
+                stages.append(('BGR', self._stage_color_correction, None))
+            if self._use_cuda:
+                stages.append(('BGR', self._stage_hdr, None))
+            else:
+                stages.append(('LAB', self._stage_clahe_l, None))
+                stages.append(('HSV', self._stage_hdr_saturation, None))
+        
+        return stages
+    
+    def _convert_space(self, image, src, dst):
+        """
+        Convierte una imagen entre los espacios de color de las etapas.
+        
+        Las conversiones a LAB o HSV se escriben en el búfer de color del hilo;
+        las conversiones a BGR devuelven una imagen nueva.
+        
+        Args:
+            image (numpy.ndarray): Imagen en el espacio `src`.
+            src (str): Espacio de color de origen ('BGR', 'LAB' o 'HSV').
+            dst (str): Espacio de color de destino ('BGR', 'LAB' o 'HSV').
+            
+        Returns:
+            numpy.ndarray: Imagen en el espacio `dst`.
+        """
+        if src != 'BGR' and dst != 'BGR':
+            # No hay conversión directa entre LAB y HSV
+            image = cv2.cvtColor(image, _COLOR_CONVERSIONS[(src, 'BGR')])
+            src = 'BGR'
+        
+        code = _COLOR_CONVERSIONS[(src, dst)]
+        if dst == 'BGR':
+            return cv2.cvtColor(image, code)
+        
+        color_buf = self._ensure_buffers(image.shape)[0]
+        cv2.cvtColor(image, code, dst=color_buf)
+        return color_buf
+    
+    def _stage_basic(self, image, context):
+        """
+        Etapa BGR: mejoras básicas de nitidez, contraste y color.
+        """
+        return self.enhance_basic(image)
+    
+    def _stage_skin(self, image, context):
+        """
+        Etapa BGR: detecta los rostros una sola vez y mejora su piel.
+        """
+        context['faces'] = self._detect_faces(image)
+        return self.enhance_skin(image, context['faces'])
+    
+    def _stage_color_correction(self, image, context):
+        """
+        Etapa BGR: ajusta los colores del resultado a los de la imagen objetivo.
+        """
+        return self.enhance_color_correction(image, context['target_img'],
+                                             context['source_img'])
+    
+    def _stage_hdr(self, image, context):
+        """
+        Etapa BGR: efecto HDR completo (en la GPU cuando se usa CUDA).
+        """
+        return self.enhance_hdr_effect(image)
+    
+    def _stage_clahe_l(self, lab, context):
+        """
+        Etapa LAB: aplica CLAHE al canal de luminancia en el lugar.
+        """
+        _, plane_buf, bump_buf = self._ensure_buffers(lab.shape)
+        cv2.extractChannel(lab, 0, dst=plane_buf)
+        self._get_clahe().apply(plane_buf, dst=bump_buf)
+        cv2.insertChannel(bump_buf, lab, 0)
+        return lab
+    
+    def _stage_features(self, hsv, context):
+        """
+        Etapa HSV: realza la saturación de ojos y labios en el lugar.
+        """
+        _, plane_buf, bump_buf = self._ensure_buffers(hsv.shape)
+        cv2.extractChannel(hsv, 1, dst=plane_buf)
+        self._boost_features_saturation(plane_buf, context['faces'], bump_buf)
+        cv2.insertChannel(plane_buf, hsv, 1)
+        return hsv
+    
+    def _stage_hdr_saturation(self, hsv, context):
+        """
+        Etapa HSV: aumento de saturación global del efecto HDR, en el lugar.
+        """
+        _, plane_buf, _ = self._ensure_buffers(hsv.shape)
+        cv2.extractChannel(hsv, 1, dst=plane_buf)
+        cv2.add(plane_buf, 10, dst=plane_buf)
+        cv2.insertChannel(plane_buf, hsv, 1)
+        return hsv
+    
+    def _ensure_buffers(self, shape):
+        """
+        Obtiene los búferes de trabajo del hilo actual para imágenes de la forma dada.
+        
+        Los búferes se reservan una vez y solo se vuelven a crear si cambia la forma.
+        Son locales a cada hilo para poder procesar imágenes en paralelo.
+        
+        Args:
+            shape (tuple): Forma (alto, ancho, 3) de la imagen BGR.
+            
+        Returns:
+            tuple: Búfer de color (alto, ancho, 3) y dos planos (alto, ancho) uint8.
+        """
+        buffers = getattr(self._local, 'arrays', None)
+        if buffers is None or buffers[0].shape != tuple(shape):
+            buffers = (
+                np.empty(shape, dtype=np.uint8),
+                np.empty(shape[:2], dtype=np.uint8),
+                np.empty(shape[:2], dtype=np.uint8),
+            )
+            self._local.arrays = buffers
+        return buffers
+    
+    def _get_clahe(self):
+        """
+        Obtiene el objeto CLAHE del hilo actual.
+        
+        `cv2.CLAHE` guarda búferes internos entre llamadas a `apply`, por lo que
+        cada hilo usa el suyo para poder procesar imágenes en paralelo.
+        
+        Returns:
+            cv2.CLAHE: Objeto CLAHE (clipLimit=2.0, tileGridSize=(8, 8)).
+        """
+        clahe = getattr(self._local, 'clahe', None)
+        if clahe is None:
+            clahe = self._local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        return clahe
+    
+    def _get_cascade(self):
+        """
+        Obtiene el clasificador Haar de rostros del hilo actual.
+        
+        `detectMultiScale` no es seguro entre hilos sobre un mismo clasificador,
+        por lo que cada hilo carga el suyo la primera vez que lo necesita.
+        
+        Returns:
+            cv2.CascadeClassifier: Clasificador de rostros frontales.
+        """
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            cascade = self._local.cascade = cv2.CascadeClassifier(_HAAR_CASCADE_PATH)
+        return cascade
\ No newline at end of file
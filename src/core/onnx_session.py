@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo de configuración de sesiones de ONNX Runtime.
+
+Este módulo contiene funciones auxiliares para crear sesiones de
+inferencia de ONNX Runtime con opciones ajustadas para el rendimiento
+de los modelos utilizados por InsightFace.
+"""
+
+import logging
+import os
+import onnxruntime as ort
+
+logger = logging.getLogger('FaceSwapPro.OnnxSession')
+
+def create_session_options():
+    """
+    Crea las opciones de sesión optimizadas para ONNX Runtime.
+
+    Activa todas las optimizaciones de grafo, ejecución secuencial y limita
+    los hilos intra-operación a los núcleos físicos para evitar sobresuscripción.
+
+    Returns:
+        onnxruntime.SessionOptions: Opciones de sesión configuradas.
+    """
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = max(1, (os.cpu_count() or 2) // 2)
+    options.add_session_config_entry("session.intra_op.allow_spinning", "1")
+    return options
+
+def get_execution_providers(cache_dir=None):
+    """
+    Obtiene los proveedores de ejecución disponibles en orden de preferencia.
+
+    Prefiere TensorRT, luego CUDA y finalmente CPU, omitiendo los que no
+    estén disponibles en la instalación actual de ONNX Runtime. Con la variable
+    de entorno `FSP_CPU_ONLY=1` solo se usa la CPU, sin inicializar la GPU.
+
+    Args:
+        cache_dir (str, opcional): Directorio para la caché de motores de TensorRT.
+
+    Returns:
+        list: Proveedores de ejecución para `onnxruntime.InferenceSession`.
+    """
+    if os.environ.get('FSP_CPU_ONLY') == '1':
+        return ['CPUExecutionProvider']
+
+    available = ort.get_available_providers()
+    providers = []
+
+    if 'TensorrtExecutionProvider' in available:
+        trt_options = {'trt_fp16_enable': True}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            trt_options['trt_engine_cache_enable'] = True
+            trt_options['trt_engine_cache_path'] = cache_dir
+        providers.append(('TensorrtExecutionProvider', trt_options))
+
+    if 'CUDAExecutionProvider' in available:
+        providers.append('CUDAExecutionProvider')
+
+    providers.append('CPUExecutionProvider')
+    return providers
+
+def create_session(model_file, providers):
+    """
+    Crea una sesión de inferencia de ONNX Runtime con las opciones optimizadas.
+
+    Args:
+        model_file (str): Ruta al modelo ONNX.
+        providers (list): Proveedores de ejecución.
+
+    Returns:
+        onnxruntime.InferenceSession: Sesión de inferencia.
+    """
+    try:
+        return ort.InferenceSession(
+            model_file,
+            sess_options=create_session_options(),
+            providers=providers
+        )
+    except Exception as e:
+        # Si las opciones no son compatibles, crear la sesión con las predeterminadas
+        logger.warning(f"No se pudo optimizar la sesión de {model_file}: {e}")
+        return ort.InferenceSession(model_file, providers=providers)
@@ -12,7 +12,11 @@ y la mejora de imágenes.
 import os
 import cv2
 import time
+import hashlib
 import logging
+import ssl
+from urllib import request
+from concurrent.futures import ThreadPoolExecutor
 from .core import FaceDetector, FaceSwapper, ImageEnhancer
 from .gui import AppWindow
 from .utils import ImageUtils
@@ -26,6 +30,17 @@ class FaceSwapApp:
     interfaz gráfica.
     """
     
+    # Hash SHA-256 esperado del modelo inswapper_128.onnx
+    MODEL_SHA256 = "e4a3f08c753cb72d04e10aa0f7dbe3deebbf39567d4ead6dce08e98aa49e16af"
+    
+    # Tamaño de bloque para la descarga del modelo (1 MB)
+    DOWNLOAD_CHUNK_SIZE = 1 << 20
+    
+    # Imágenes procesadas a la vez en los lotes. Cada sesión de ONNX Runtime ya usa
+    # la mitad de los núcleos (intra_op_num_threads), así que dos hilos bastan para
+    # solapar la lectura, las mejoras y el guardado con la inferencia sin sobresuscribir
+    BATCH_WORKERS = 2
+    
     def __init__(self, model_path, data_dir, output_dir):
         """
         Inicializa la aplicación FaceSwapPro.
@@ -39,6 +54,9 @@ class FaceSwapApp:
         self.data_dir = data_dir
         self.output_dir = output_dir
         
+        # Caché de la lista de imágenes: (mtime del directorio, nombres)
+        self._images_cache = None
+        
         # Configurar logging
         logging.basicConfig(
             level=logging.INFO,
@@ -70,12 +88,17 @@ class FaceSwapApp:
             # Inicializar intercambiador de rostros
             self.face_swapper = FaceSwapper(self.model_path)
             
-            # Inicializar mejorador de imágenes
-            self.image_enhancer = ImageEnhancer()
+            # Inicializar mejorador de imágenes (YuNet si el modelo está junto al de intercambio)
+            yunet_path = os.path.join(os.path.dirname(self.model_path),
+                                      "face_detection_yunet_2023mar.onnx")
+            self.image_enhancer = ImageEnhancer(yunet_path)
             
             # Inicializar utilidades de imagen
             self.image_utils = ImageUtils()
             
+            # Pool para solapar la lectura de imágenes con la detección de rostros
+            self._io_pool = ThreadPoolExecutor(max_workers=2)
+            
             self.logger.info("Componentes inicializados correctamente")
         except Exception as e:
             self.logger.error(f"Error al inicializar componentes: {e}")
@@ -88,16 +111,28 @@ class FaceSwapApp:
         Returns:
             list: Lista de nombres de archivos de imágenes.
         """
-        if not os.path.exists(self.data_dir):
+        # Una sola llamada a stat comprueba que el directorio existe y obtiene su fecha
+        try:
+            dir_mtime = os.stat(self.data_dir).st_mtime_ns
+        except FileNotFoundError:
             self.logger.warning(f"El directorio {self.data_dir} no existe. Creándolo...")
             os.makedirs(self.data_dir)
             return []
         
-        image_files = [f for f in os.listdir(self.data_dir) 
-                      if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-        return image_files
+        # Reutilizar la lista anterior si el directorio no ha cambiado
+        if self._images_cache is not None and self._images_cache[0] == dir_mtime:
+            return list(self._images_cache[1])
+        
+        with os.scandir(self.data_dir) as entries:
+            image_files = [entry.name for entry in entries
+                          if entry.name.lower().endswith(('.jpg', '.jpeg', '.png'))
+                          and entry.is_file()]
+        
+        self._images_cache = (dir_mtime, image_files)
+        return list(image_files)
     
-    def process_face_swap(self, source_img_path, target_img_path, quality_level=2):
+    def process_face_swap(self, source_img_path, target_img_path, quality_level=2,
+                          source_img=None, target_img=None, return_image=False):
         """
         Procesa el intercambio de rostros entre dos imágenes.
         
@@ -105,71 +140,192 @@ class FaceSwapApp:
             source_img_path (str): Ruta a la imagen fuente (rostro a usar).
             target_img_path (str): Ruta a la imagen objetivo (donde poner el rostro).
             quality_level (int, opcional): Nivel de calidad del resultado (1-3).
+            source_img (numpy.ndarray, opcional): Imagen fuente ya cargada. Si no se
+                proporciona, se lee desde `source_img_path`.
+            target_img (numpy.ndarray, opcional): Imagen objetivo ya cargada. Si no se
+                proporciona, se lee desde `target_img_path`.
+            return_image (bool, opcional): Si es True, devuelve también la imagen
+                resultado, para mostrarla sin volver a leerla del disco.
             
         Returns:
-            str: Ruta del archivo de resultado o None si ocurre un error.
+            str: Ruta del archivo de resultado o None si ocurre un error. Con
+                `return_image`, una tupla (ruta, imagen BGR) o (None, None).
         """
+        failure = (None, None) if return_image else None
         try:
             self.logger.info(f"Iniciando intercambio de rostros con nivel de calidad {quality_level}")
             start_time = time.time()
             
-            # Cargar imágenes
-            source_img = cv2.imread(source_img_path)
-            target_img = cv2.imread(target_img_path)
+            # Cargar imágenes en paralelo (si no se proporcionaron ya decodificadas)
+            source_future = None
+            target_future = None
+            if source_img is None:
+                source_future = self._io_pool.submit(cv2.imread, source_img_path)
+            if target_img is None:
+                target_future = self._io_pool.submit(cv2.imread, target_img_path)
             
-            if source_img is None or target_img is None:
+            # Detectar rostros en la fuente mientras se termina de decodificar el objetivo
+            if source_future is not None:
+                source_img = source_future.result()
+            if source_img is None:
                 self.logger.error("No se pudieron cargar las imágenes")
-                return None
+                return failure
+            source_faces_future = self._io_pool.submit(self.face_detector.detect_faces, source_img)
+            
+            if target_future is not None:
+                target_img = target_future.result()
+            if target_img is None:
+                self.logger.error("No se pudieron cargar las imágenes")
+                source_faces_future.cancel()
+                return failure
             
             # Detectar rostros
-            source_faces = self.face_detector.detect_faces(source_img)
             target_faces = self.face_detector.detect_faces(target_img)
+            source_faces = source_faces_future.result()
             
             if not source_faces or not target_faces:
                 self.logger.error("No se detectaron rostros en las imágenes")
-                return None
+                return failure
             
-            # Realizar intercambio de rostros
-            result_img = self.face_swapper.swap_face(
-                target_img, 
-                target_faces[0], 
-                source_img, 
-                source_faces[0]
+            # Intercambiar, mejorar y guardar el resultado
+            result_path, result_img = self._swap_enhance_save(
+                source_img_path, source_img, source_faces[0],
+                target_img_path, target_img, target_faces[0], quality_level
             )
             
-            # Aplicar mejoras según el nivel de calidad
-            if quality_level >= 1:
-                result_img = self.image_enhancer.enhance_basic(result_img)
-            
-            if quality_level >= 2:
-                result_img = self.image_enhancer.enhance_skin(result_img)
-                result_img = self.image_enhancer.enhance_facial_features(result_img)
-            
-            if quality_level >= 3:
-                result_img = self.image_enhancer.enhance_color_correction(
-                    result_img, target_img, source_img
-                )
-                result_img = self.image_enhancer.enhance_hdr_effect(result_img)
-            
-            # Crear nombre del archivo de resultado
-            source_name = os.path.splitext(os.path.basename(source_img_path))[0]
-            target_name = os.path.splitext(os.path.basename(target_img_path))[0]
-            quality_suffix = ["BASICO", "HD", "ULTRA_HD"][quality_level - 1]
-            
-            result_filename = f"{quality_suffix}_{target_name}_con_rostro_de_{source_name}.png"
-            result_path = os.path.join(self.output_dir, result_filename)
-            
-            # Guardar resultado
-            cv2.imwrite(result_path, result_img)
-            
             elapsed_time = time.time() - start_time
             self.logger.info(f"Proceso completado en {elapsed_time:.2f} segundos")
             
-            return result_path
+            return (result_path, result_img) if return_image else result_path
         
         except Exception as e:
             self.logger.error(f"Error en el proceso de intercambio de rostros: {e}")
-            return None
+            return failure
+    
+    def process_face_swap_batch(self, source_img_path, target_img_paths, quality_level=2):
+        """
+        Procesa el intercambio de un mismo rostro fuente en varias imágenes objetivo.
+        
+        La imagen fuente se carga y analiza una sola vez; las imágenes objetivo
+        se procesan en paralelo.
+        
+        Args:
+            source_img_path (str): Ruta a la imagen fuente (rostro a usar).
+            target_img_paths (list): Rutas a las imágenes objetivo.
+            quality_level (int, opcional): Nivel de calidad del resultado (1-3).
+            
+        Returns:
+            list: Rutas de los archivos de resultado, en el mismo orden que
+                  `target_img_paths`, con None en las imágenes que fallen.
+        """
+        self.logger.info(f"Iniciando intercambio por lotes de {len(target_img_paths)} imágenes "
+                         f"con nivel de calidad {quality_level}")
+        start_time = time.time()
+        
+        try:
+            # Cargar y analizar la imagen fuente una única vez
+            source_img = cv2.imread(source_img_path)
+            if source_img is None:
+                self.logger.error("No se pudo cargar la imagen fuente")
+                return [None] * len(target_img_paths)
+            
+            source_faces = self.face_detector.detect_faces(source_img)
+            if not source_faces:
+                self.logger.error("No se detectaron rostros en la imagen fuente")
+                return [None] * len(target_img_paths)
+            
+            source_face = source_faces[0]
+            source_latent = self.face_swapper.prepare_source(source_face)
+        except Exception as e:
+            self.logger.error(f"Error al preparar la imagen fuente: {e}")
+            return [None] * len(target_img_paths)
+        
+        def process_target(target_img_path):
+            try:
+                target_img = cv2.imread(target_img_path)
+                if target_img is None:
+                    self.logger.error(f"No se pudo cargar la imagen: {target_img_path}")
+                    return None
+                
+                target_faces = self.face_detector.detect_faces(target_img)
+                if not target_faces:
+                    self.logger.error(f"No se detectaron rostros en: {target_img_path}")
+                    return None
+                
+                result_path, _ = self._swap_enhance_save(
+                    source_img_path, source_img, source_face,
+                    target_img_path, target_img, target_faces[0], quality_level,
+                    source_latent
+                )
+                return result_path
+            except Exception as e:
+                self.logger.error(f"Error al procesar {target_img_path}: {e}")
+                return None
+        
+        # ONNX Runtime y OpenCV liberan el GIL, por lo que los hilos trabajan en paralelo
+        max_workers = max(1, min(self.BATCH_WORKERS, len(target_img_paths)))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            result_paths = list(pool.map(process_target, target_img_paths))
+        
+        elapsed_time = time.time() - start_time
+        self.logger.info(f"Lote completado en {elapsed_time:.2f} segundos")
+        
+        return result_paths
+    
+    def _swap_enhance_save(self, source_img_path, source_img, source_face,
+                           target_img_path, target_img, target_face, quality_level,
+                           source_latent=None):
+        """
+        Intercambia el rostro, aplica las mejoras del nivel de calidad y guarda el resultado.
+        
+        Args:
+            source_img_path (str): Ruta a la imagen fuente.
+            source_img (numpy.ndarray): Imagen fuente.
+            source_face (object): Rostro detectado en la imagen fuente.
+            target_img_path (str): Ruta a la imagen objetivo.
+            target_img (numpy.ndarray): Imagen objetivo.
+            target_face (object): Rostro detectado en la imagen objetivo.
+            quality_level (int): Nivel de calidad del resultado (1-3).
+            source_latent (numpy.ndarray, opcional): Vector latente precalculado del
+                rostro fuente.
+            
+        Returns:
+            tuple: Ruta del archivo de resultado e imagen resultado (BGR).
+        """
+        # Realizar intercambio de rostros
+        result_img = self.face_swapper.swap_face(
+            target_img, 
+            target_face, 
+            source_img, 
+            source_face,
+            source_latent
+        )
+        
+        # Aplicar mejoras según el nivel de calidad (los rostros se detectan una sola vez
+        # y las etapas que comparten espacio de color se ejecutan seguidas)
+        result_img = self.image_enhancer.apply_all_fused(
+            result_img, quality_level, target_img=target_img, source_img=source_img
+        )
+        
+        # Crear nombre del archivo de resultado
+        source_name = os.path.splitext(os.path.basename(source_img_path))[0]
+        target_name = os.path.splitext(os.path.basename(target_img_path))[0]
+        quality_suffix = ["BASICO", "HD", "ULTRA_HD"][quality_level - 1]
+        
+        # Solo Ultra HD se guarda sin pérdidas (PNG); el resto usa JPEG, mucho más rápido
+        if quality_level >= 3:
+            extension, write_params = ".png", []
+        else:
+            extension = ".jpg"
+            write_params = [cv2.IMWRITE_JPEG_QUALITY, 92, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+        
+        result_filename = f"{quality_suffix}_{target_name}_con_rostro_de_{source_name}{extension}"
+        result_path = os.path.join(self.output_dir, result_filename)
+        
+        # Guardar resultado
+        cv2.imwrite(result_path, result_img, write_params)
+        
+        return result_path, result_img
     
     def verify_model(self):
         """
@@ -181,9 +337,7 @@ class FaceSwapApp:
         if os.path.exists(self.model_path):
             return True
         
-        from urllib import request
-        import ssl
-        
+        partial_path = self.model_path + ".part"
         try:
             self.logger.info(f"Descargando modelo desde Hugging Face...")
             
@@ -196,16 +350,28 @@ class FaceSwapApp:
             # URL del modelo en Hugging Face
             model_url = "https://huggingface.co/hacksider/inswapper_128/resolve/main/inswapper_128.onnx"
             
-            # Descargar modelo
+            # Descargar modelo en bloques de 1 MB calculando su hash SHA-256
+            sha256 = hashlib.sha256()
             with request.urlopen(model_url, context=ssl_context) as response:
-                with open(self.model_path, 'wb') as f:
-                    f.write(response.read())
+                with open(partial_path, 'wb') as f:
+                    for chunk in iter(lambda: response.read(self.DOWNLOAD_CHUNK_SIZE), b''):
+                        sha256.update(chunk)
+                        f.write(chunk)
+            
+            # Verificar integridad antes de dar el modelo por válido
+            if sha256.hexdigest() != self.MODEL_SHA256:
+                raise ValueError("El hash SHA-256 del modelo descargado no coincide")
+            
+            os.replace(partial_path, self.model_path)
             
             self.logger.info(f"Modelo descargado correctamente en: {self.model_path}")
             return True
         
         except Exception as e:
             self.logger.error(f"Error al descargar el modelo: {e}")
+            # No dejar una descarga incompleta o corrupta en la carpeta de modelos
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
             return False
     
     def run(self):
@@ -218,4 +384,15 @@ class FaceSwapApp:
             return
         
         # Ejecutar la interfaz gráfica
-        self.app_window.run()
\ No newline at end of file
+        try:
+            self.app_window.run()
+        finally:
+            self.close()
+    
+    def close(self):
+        """
+        Libera los hilos de trabajo de la aplicación.
+        
+        Puede llamarse varias veces; las tareas en curso no se esperan.
+        """
+        self._io_pool.shutdown(wait=False)
\ No newline at end of file
@@ -8,15 +8,47 @@ Este módulo contiene la clase AppWindow que implementa la interfaz
 gráfica de usuario utilizando Tkinter con un diseño moderno y atractivo.
 """
 
+import base64
 import logging
 import os
 import threading
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
+from PIL import Image, ImageTk, __version__ as PIL_VERSION
 import cv2
 import numpy as np
 import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ..utils import fast_copy
+
+# Número máximo de vistas previas y de imágenes decodificadas en caché
+PREVIEW_CACHE_SIZE = 16
+DECODED_CACHE_SIZE = 4
+
+# Grosor del borde dibujado alrededor de las vistas previas
+PREVIEW_BORDER_WIDTH = 2
+
+# Espera (ms) tras el último cambio de tamaño antes de redibujar las vistas previas
+RESIZE_DEBOUNCE_MS = 120
+
+# Intervalo (ms) entre comprobaciones de cambios en la carpeta de datos
+IMAGES_POLL_MS = 2000
+
+# Intervalo mínimo (s) entre actualizaciones intermedias de la barra de progreso
+PROGRESS_MIN_INTERVAL = 0.05
+
+# Lado máximo (en píxeles) de las miniaturas que se crean sin pasar por Pillow
+FAST_PHOTO_MAX_SIZE = 128
+
+# Modos de lectura de OpenCV que decodifican un JPEG directamente a escala reducida
+_IMREAD_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
 
 class AppWindow:
     """
@@ -36,18 +68,42 @@ class AppWindow:
         self.logger = logging.getLogger('FaceSwapPro.AppWindow')
         self.logger.info("Inicializando interfaz gráfica...")
         
+        # Las compilaciones de Pillow-SIMD se publican con sufijo ".postN"
+        simd = " (Pillow-SIMD)" if ".post" in PIL_VERSION else ""
+        self.logger.info(f"Usando Pillow {PIL_VERSION}{simd}")
+        
         self.app = app
         self.source_img_path = None
         self.target_img_path = None
         self.result_img_path = None
         
-        # Variables para mostrar imágenes
-        self.source_img = None
-        self.target_img = None
-        self.result_img = None
+        # Cachés LRU de vistas previas (imagen ajustada por tamaño de canvas) e imágenes
+        # decodificadas; la fecha de modificación forma parte de la clave, por lo que
+        # un archivo modificado nunca reutiliza una entrada antigua
+        self._preview_cache = OrderedDict()
+        self._decoded_cache = OrderedDict()
+        self._decoded_lock = threading.Lock()
+        
+        # Decodificación de vistas previas en segundo plano
+        self._preview_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='preview')
+        self._preview_requests = {}
+        self._preview_token = 0
+        self._canvas_items = {}
+        self._pending_redraw = {}
+        
+        # Última lista de imágenes mostrada en los combobox
+        self._last_images_key = None
+        self._data_dir_mtime = None
         
         # Variables para controlar procesamiento
         self.processing = False
+        self._last_progress = 0.0
+        
+        # Hilo persistente para el intercambio de rostros (separado de los de E/S, para
+        # que un intercambio largo no retrase las vistas previas ni las copias)
+        self._compute_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='compute')
+        self._io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='io')
+        self._current_future = None
         
         # Crear ventana principal primero
         self.root = tk.Tk()
@@ -80,8 +136,19 @@ class AppWindow:
         Ejecuta la ventana principal de la aplicación.
         """
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
         self.root.mainloop()
     
+    def _on_close(self):
+        """
+        Cierra la ventana liberando los hilos de trabajo.
+        """
+        self._compute_pool.shutdown(wait=False)
+        self._io_pool.shutdown(wait=False)
+        self._preview_pool.shutdown(wait=False)
+        self.app.close()
+        self.root.destroy()
+    
     def setup_ui(self):
         """
         Configura la interfaz de usuario.
@@ -111,8 +178,9 @@ class AppWindow:
                              anchor=tk.W, padding=(10, 5))
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Cargar imágenes disponibles
+        # Cargar imágenes disponibles y vigilar cambios en la carpeta de datos
         self.load_available_images()
+        self.root.after(IMAGES_POLL_MS, self._poll_available_images)
     
     def setup_style(self):
         """
@@ -354,6 +422,11 @@ class AppWindow:
         images_panel.grid_rowconfigure(1, weight=2)  # Dar más espacio al resultado
         images_panel.grid_columnconfigure(0, weight=1)
         images_panel.grid_columnconfigure(1, weight=1)
+        
+        # Elementos persistentes de las vistas previas y redibujado al cambiar de tamaño
+        for canvas in (self.source_canvas, self.target_canvas, self.result_canvas):
+            self._create_canvas_items(canvas)
+            canvas.bind("<Configure>", self._on_canvas_resize)
     
     def load_available_images(self):
         """
@@ -362,32 +435,72 @@ class AppWindow:
         self.logger.info("Cargando imágenes disponibles...")
         
         # Obtener lista de imágenes
+        self._data_dir_mtime = self._get_data_dir_mtime()
         images = self.app.get_available_images()
         
-        # Configurar comboboxes
+        # Si la lista no cambió, no reconstruir los combobox ni perder la selección
+        images_key = tuple(images)
+        if images_key == self._last_images_key:
+            self._show_images_status(images)
+            return
+        self._last_images_key = images_key
+        
+        # Configurar comboboxes conservando la selección actual si sigue disponible
+        previous_source = self.source_combo.get()
+        previous_target = self.target_combo.get()
         self.source_combo['values'] = images
         self.target_combo['values'] = images
         
         # Mostrar mensaje según número de imágenes
+        self._show_images_status(images)
         if not images:
-            self.status_var.set("No hay imágenes disponibles. Por favor, cargue algunas.")
             messagebox.showinfo("Sin imágenes", 
                              "No hay imágenes disponibles en la carpeta de datos.\n"
                              "Por favor, cargue algunas imágenes usando 'Cargar Imagen'.")
+        else:
+            # Si no había selección, seleccionar las primeras imágenes
+            source_index = images.index(previous_source) if previous_source in images else 0
+            target_index = (images.index(previous_target) if previous_target in images
+                            else min(1, len(images) - 1))
+            self.source_combo.current(source_index)
+            self.target_combo.current(target_index)
+            self.on_source_selected(None)
+            self.on_target_selected(None)
+    
+    def _get_data_dir_mtime(self):
+        """
+        Obtiene la fecha de modificación de la carpeta de datos.
+        
+        Returns:
+            int: Fecha de modificación en nanosegundos, o None si no se puede leer.
+        """
+        try:
+            return os.stat(self.app.data_dir).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _poll_available_images(self):
+        """
+        Recarga la lista de imágenes si la carpeta de datos cambió y se vuelve a programar.
+        
+        Añadir o eliminar archivos cambia la fecha de modificación de la carpeta,
+        por lo que mientras no cambie basta con una llamada a `os.stat`.
+        """
+        if self._get_data_dir_mtime() != self._data_dir_mtime:
+            self.load_available_images()
+        self.root.after(IMAGES_POLL_MS, self._poll_available_images)
+    
+    def _show_images_status(self, images):
+        """
+        Muestra en la barra de estado el número de imágenes disponibles.
+        
+        Args:
+            images (list): Nombres de las imágenes disponibles.
+        """
+        if not images:
+            self.status_var.set("No hay imágenes disponibles. Por favor, cargue algunas.")
         else:
             self.status_var.set(f"Se encontraron {len(images)} imágenes. ¡Listo para comenzar!")
-            
-            # Seleccionar las primeras imágenes si hay más de una
-            if len(images) >= 2:
-                self.source_combo.current(0)
-                self.target_combo.current(1)
-                self.on_source_selected(None)
-                self.on_target_selected(None)
-            elif len(images) == 1:
-                self.source_combo.current(0)
-                self.target_combo.current(0)
-                self.on_source_selected(None)
-                self.on_target_selected(None)
     
     def on_source_selected(self, event):
         """
@@ -441,20 +554,51 @@ class AppWindow:
         if not file_paths:
             return
         
-        # Copiar archivos seleccionados a la carpeta de datos
+        # Copiar en segundo plano para no bloquear la interfaz
+        self.status_var.set(f"Copiando {len(file_paths)} imágenes...")
+        threading.Thread(target=self._copy_images, args=(file_paths,), daemon=True).start()
+    
+    def _copy_images(self, file_paths):
+        """
+        Copia las imágenes seleccionadas a la carpeta de datos en paralelo (hilo separado).
+        
+        Args:
+            file_paths (tuple): Rutas de las imágenes a copiar.
+        """
         copied_files = []
-        for file_path in file_paths:
-            file_name = os.path.basename(file_path)
-            dest_path = os.path.join(self.app.data_dir, file_name)
-            
+        errors = []
+        total = len(file_paths)
+        
+        # La copia libera el GIL: varios archivos se copian a la vez en el pool de E/S
+        futures = {
+            self._io_pool.submit(fast_copy, file_path,
+                                 os.path.join(self.app.data_dir, os.path.basename(file_path))):
+                os.path.basename(file_path)
+            for file_path in file_paths
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            file_name = futures[future]
             try:
-                import shutil
-                shutil.copy2(file_path, dest_path)
+                dest_path = future.result()
                 self.logger.info(f"Imagen copiada a: {dest_path}")
                 copied_files.append(file_name)
             except Exception as e:
                 self.logger.error(f"Error al copiar imagen: {e}")
-                messagebox.showerror("Error", f"No se pudo copiar la imagen: {e}")
+                errors.append(f"{file_name}: {e}")
+            self.update_progress(int(100 * done / total), f"Copiando imágenes ({done}/{total})...")
+        
+        self.root.after(0, self._on_images_copied, copied_files, errors)
+    
+    def _on_images_copied(self, copied_files, errors):
+        """
+        Actualiza la interfaz al terminar la copia de imágenes (hilo de la interfaz).
+        
+        Args:
+            copied_files (list): Nombres de las imágenes copiadas.
+            errors (list): Mensajes de error de las copias fallidas.
+        """
+        if errors:
+            messagebox.showerror("Error", "No se pudo copiar la imagen:\n" + "\n".join(errors))
         
         # Actualizar lista de imágenes
         self.load_available_images()
@@ -485,7 +629,7 @@ class AppWindow:
         self.progress_label.config(text="Iniciando procesamiento...")
         self.status_var.set("⏳ Procesando intercambio de rostros...")
         
-        threading.Thread(target=self.process_face_swap, daemon=True).start()
+        self._current_future = self._compute_pool.submit(self.process_face_swap)
     
     def process_face_swap(self):
         """
@@ -503,10 +647,11 @@ class AppWindow:
             self.update_progress(30, f"Realizando intercambio en calidad {quality_text}...")
             
             # Llamar al método de procesamiento de la aplicación principal
-            self.result_img_path = self.app.process_face_swap(
+            self.result_img_path, result_img = self.app.process_face_swap(
                 self.source_img_path, 
                 self.target_img_path, 
-                quality
+                quality,
+                return_image=True
             )
             
             # Verificar resultado
@@ -519,7 +664,9 @@ class AppWindow:
             
             # Mostrar resultado
             self.update_progress(80, "Cargando el resultado final...")
-            self.root.after(0, lambda: self.show_image_on_canvas(self.result_img_path, self.result_canvas))
+            # La imagen ya está en memoria: no hace falta volver a leerla del disco
+            self.root.after(0, lambda: self.show_image_on_canvas(self.result_img_path,
+                                                                 self.result_canvas, result_img))
             
             # Completado
             self.update_progress(100, "¡Procesamiento completado con éxito!")
@@ -547,22 +694,46 @@ class AppWindow:
             value (int): Valor del progreso (0-100).
             text (str): Texto descriptivo del progreso.
         """
-        self.root.after(0, lambda: self.progress.config(value=value))
-        self.root.after(0, lambda: self.progress_label.config(text=text))
-        self.root.after(0, lambda: self.status_var.set(text))
+        # Limitar la frecuencia de actualización, salvo al empezar y al terminar
+        now = time.monotonic()
+        if value not in (0, 100) and now - self._last_progress < PROGRESS_MIN_INTERVAL:
+            return
+        self._last_progress = now
+        
+        # Una sola llamada al bucle de eventos de Tk para los tres widgets
+        self.root.after(0, self._apply_progress, value, text)
     
-    def show_image_on_canvas(self, image_path, canvas):
+    def _apply_progress(self, value, text):
+        """
+        Aplica el progreso a la barra, su etiqueta y la barra de estado (hilo de la interfaz).
+        
+        Args:
+            value (int): Valor del progreso (0-100).
+            text (str): Texto descriptivo del progreso.
+        """
+        self.progress.config(value=value)
+        self.progress_label.config(text=text)
+        self.status_var.set(text)
+    
+    def show_image_on_canvas(self, image_path, canvas, image=None):
         """
         Muestra una imagen en un canvas, ajustando su tamaño.
         
+        La decodificación y el redimensionado se hacen en segundo plano; la
+        imagen se dibuja en el hilo de la interfaz cuando está lista.
+        
         Args:
             image_path (str): Ruta de la imagen a mostrar.
             canvas: Canvas donde mostrar la imagen.
+            image (numpy.ndarray, opcional): Contenido de `image_path` ya en memoria
+                (BGR). Si se proporciona, no se lee el archivo.
         """
+        # Cada petición invalida las anteriores aún en curso para el mismo canvas
+        self._preview_token += 1
+        token = self._preview_token
+        self._preview_requests[canvas] = token
+        
         try:
-            # Cargar imagen
-            img = Image.open(image_path)
-            
             # Obtener dimensiones del canvas
             canvas_width = canvas.winfo_width()
             canvas_height = canvas.winfo_height()
@@ -573,55 +744,343 @@ class AppWindow:
             if canvas_height <= 1:
                 canvas_height = 300
             
-            # Calcular tamaño para ajustar al canvas manteniendo proporción
-            img_width, img_height = img.size
-            ratio = min(canvas_width / img_width, canvas_height / img_height)
-            new_width = int(img_width * ratio)
-            new_height = int(img_height * ratio)
+            # Filtro de alta calidad solo para el resultado, que es el que se inspecciona
+            # con detalle; las miniaturas de origen y destino usan uno bilineal
+            high_quality = canvas is self.result_canvas
             
-            # Redimensionar imagen
-            img = img.resize((new_width, new_height), Image.LANCZOS)
+            # Reutilizar la vista previa si la imagen y el tamaño del canvas no cambiaron
+            mtime = os.path.getmtime(image_path)
+            preview_key = (image_path, mtime, canvas_width, canvas_height, high_quality)
+            cached = self._preview_cache.get(preview_key)
+            if cached is not None:
+                self._preview_cache.move_to_end(preview_key)
+                self._blit_to_canvas(canvas, *cached)
+                return
             
-            # Convertir a formato para Tkinter
-            photo_img = ImageTk.PhotoImage(img)
+            future = self._preview_pool.submit(self._decode_resize, image_path, mtime,
+                                               canvas_width, canvas_height, image,
+                                               high_quality)
+            future.add_done_callback(
+                lambda f: self.root.after(0, self._on_preview_ready, canvas, token,
+                                          preview_key, f)
+            )
+        
+        except Exception as e:
+            self.logger.error(f"Error al mostrar imagen: {e}")
+            self._show_canvas_error(canvas)
+    
+    def _on_canvas_resize(self, event):
+        """
+        Programa el redibujado de la vista previa de un canvas al cambiar su tamaño.
+        
+        Los eventos seguidos (al arrastrar el borde de la ventana) se agrupan en
+        un único redibujado por canvas cuando dejan de llegar durante
+        `RESIZE_DEBOUNCE_MS`.
+        
+        Args:
+            event: Evento de cambio de tamaño.
+        """
+        canvas = event.widget
+        pending = self._pending_redraw.get(canvas)
+        if pending is not None:
+            self.root.after_cancel(pending)
+        self._pending_redraw[canvas] = self.root.after(RESIZE_DEBOUNCE_MS,
+                                                       self._redraw_preview, canvas)
+    
+    def _redraw_preview(self, canvas):
+        """
+        Vuelve a mostrar la imagen de un canvas con su tamaño actual.
+        
+        Args:
+            canvas: Canvas de vista previa.
+        """
+        self._pending_redraw.pop(canvas, None)
+        image_path = {
+            self.source_canvas: self.source_img_path,
+            self.target_canvas: self.target_img_path,
+            self.result_canvas: self.result_img_path,
+        }.get(canvas)
+        if image_path:
+            self.show_image_on_canvas(image_path, canvas)
+    
+    def _on_preview_ready(self, canvas, token, preview_key, future):
+        """
+        Guarda una vista previa terminada y la dibuja (hilo de la interfaz).
+        
+        Args:
+            canvas: Canvas donde mostrar la imagen.
+            token (int): Identificador de la petición de vista previa.
+            preview_key (tuple): Clave de la vista previa en la caché.
+            future (concurrent.futures.Future): Tarea de `_decode_resize`.
+        """
+        # Descartar resultados de selecciones anteriores
+        if self._preview_requests.get(canvas) != token:
+            return
+        
+        try:
+            img = Image.fromarray(future.result())
+            entry = (img, self._preview_layout(*preview_key[2:4], *img.size))
+            self._cache_put(self._preview_cache, preview_key, entry, PREVIEW_CACHE_SIZE)
+            self._blit_to_canvas(canvas, *entry)
+        except Exception as e:
+            self.logger.error(f"Error al mostrar imagen: {e}")
+            self._show_canvas_error(canvas)
+    
+    def _decode_resize(self, image_path, mtime, canvas_width, canvas_height, image=None,
+                       high_quality=True):
+        """
+        Decodifica una imagen y la ajusta al tamaño del canvas (hilo de trabajo).
+        
+        Args:
+            image_path (str): Ruta de la imagen.
+            mtime (float): Fecha de modificación de la imagen.
+            canvas_width (int): Ancho del canvas.
+            canvas_height (int): Alto del canvas.
+            image (numpy.ndarray, opcional): Imagen BGR ya decodificada.
+            high_quality (bool, opcional): Si es False, usa un filtro bilineal más
+                rápido en lugar de INTER_AREA/INTER_CUBIC o LANCZOS. Por defecto es True.
             
-            # Mostrar en canvas
-            canvas.delete("all")
+        Returns:
+            numpy.ndarray: Imagen RGB redimensionada.
+        """
+        if image is not None:
+            # Guardarla como decodificación completa para redibujados posteriores
+            source = image
+            with self._decoded_lock:
+                self._cache_put(self._decoded_cache, (image_path, mtime, 1), source,
+                                DECODED_CACHE_SIZE)
+        else:
+            factor = self._jpeg_reduction_factor(image_path, canvas_width, canvas_height)
+            source = self._decode_image(image_path, mtime, factor)
+        if isinstance(source, np.ndarray):
+            img_height, img_width = source.shape[:2]
+        else:
+            img_width, img_height = source.size
+        
+        # Calcular tamaño para ajustar al canvas manteniendo proporción
+        ratio = min(canvas_width / img_width, canvas_height / img_height)
+        new_width = int(img_width * ratio)
+        new_height = int(img_height * ratio)
+        
+        # Redimensionar imagen (en alta calidad, INTER_AREA al reducir e INTER_CUBIC al ampliar)
+        if isinstance(source, np.ndarray):
+            if not high_quality:
+                interpolation = cv2.INTER_LINEAR
+            else:
+                interpolation = cv2.INTER_AREA if ratio < 1 else cv2.INTER_CUBIC
+            resized = cv2.resize(source, (new_width, new_height), interpolation=interpolation)
+            return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        
+        # Reducción previa por promedio de bloques: el filtro final solo actúa sobre
+        # una imagen de como mucho el doble del tamaño final
+        resample = Image.Resampling.LANCZOS if high_quality else Image.Resampling.BILINEAR
+        resized = source.resize((new_width, new_height), resample, reducing_gap=2.0)
+        return np.asarray(resized.convert('RGB'))
+    
+    def _create_canvas_items(self, canvas):
+        """
+        Crea los elementos persistentes de un canvas de vista previa.
+        
+        Las vistas previas reutilizan estos elementos (moviéndolos con `coords` y
+        mostrándolos u ocultándolos) en lugar de borrarlos y crearlos de nuevo.
+        
+        Args:
+            canvas: Canvas de vista previa.
+        """
+        self._canvas_items[canvas] = {
+            'background': canvas.create_rectangle(0, 0, 0, 0, fill=self.colors["gray_light"],
+                                                  outline=""),
+            'border': canvas.create_rectangle(0, 0, 0, 0, outline=self.colors["primary"],
+                                              width=PREVIEW_BORDER_WIDTH, state=tk.HIDDEN),
+            'image': canvas.create_image(0, 0, anchor=tk.CENTER, state=tk.HIDDEN),
+            'error': canvas.create_text(0, 0, text="Error al cargar imagen",
+                                        fill=self.colors["accent"],
+                                        font=("Segoe UI", 11, "bold"), state=tk.HIDDEN),
+            # Referencia a la imagen mostrada para que no la elimine el recolector de basura
+            'photo': None,
+        }
+    
+    @staticmethod
+    def _preview_layout(canvas_width, canvas_height, new_width, new_height):
+        """
+        Calcula la posición de los elementos de una vista previa en el canvas.
+        
+        Se calcula una vez por entrada de la caché de vistas previas, de modo que
+        volver a mostrarla solo mueve los elementos.
+        
+        Args:
+            canvas_width (int): Ancho del canvas.
+            canvas_height (int): Alto del canvas.
+            new_width (int): Ancho de la imagen.
+            new_height (int): Alto de la imagen.
             
-            # Crear un fondo para la imagen (mejora visual)
-            canvas.create_rectangle(0, 0, canvas_width, canvas_height, 
-                                   fill=self.colors["gray_light"], outline="")
+        Returns:
+            tuple: Coordenadas del fondo, del borde y del centro de la imagen.
+        """
+        border_width = PREVIEW_BORDER_WIDTH
+        return (
+            (0, 0, canvas_width, canvas_height),
+            (canvas_width//2 - new_width//2 - border_width,
+             canvas_height//2 - new_height//2 - border_width,
+             canvas_width//2 + new_width//2 + border_width,
+             canvas_height//2 + new_height//2 + border_width),
+            (canvas_width // 2, canvas_height // 2),
+        )
+    
+    def _blit_to_canvas(self, canvas, img, layout):
+        """
+        Dibuja una vista previa ya preparada en un canvas (hilo de la interfaz).
+        
+        Si la PhotoImage actual del canvas tiene el mismo tamaño, se copian los
+        píxeles sobre ella con `paste`; si no, se crea una nueva. Las miniaturas
+        se crean con `_fast_tk_photo`.
+        
+        Args:
+            canvas: Canvas donde mostrar la imagen.
+            img (PIL.Image.Image): Imagen RGB ajustada al canvas.
+            layout (tuple): Posición de los elementos, de `_preview_layout`.
+        """
+        items = self._canvas_items[canvas]
+        
+        photo_img = items['photo']
+        if max(img.size) < FAST_PHOTO_MAX_SIZE:
+            # Miniaturas: crear la imagen de Tk directamente, sin pasar por ImageTk
+            photo_img = self._fast_tk_photo(np.asarray(img))
+            items['photo'] = photo_img
+            canvas.itemconfig(items['image'], image=photo_img)
+        elif (isinstance(photo_img, ImageTk.PhotoImage)
+                and (photo_img.width(), photo_img.height()) == img.size):
+            photo_img.paste(img)
+        else:
+            photo_img = ImageTk.PhotoImage(img)
+            items['photo'] = photo_img
+            canvas.itemconfig(items['image'], image=photo_img)
+        
+        # Fondo, borde e imagen en sus posiciones precalculadas
+        background_coords, border_coords, center = layout
+        canvas.coords(items['background'], *background_coords)
+        canvas.coords(items['border'], *border_coords)
+        canvas.coords(items['image'], *center)
+        canvas.itemconfig(items['border'], state=tk.NORMAL)
+        canvas.itemconfig(items['image'], state=tk.NORMAL)
+        canvas.itemconfig(items['error'], state=tk.HIDDEN)
+    
+    @staticmethod
+    def _fast_tk_photo(rgb):
+        """
+        Crea una imagen de Tk a partir de un array RGB sin usar Pillow.
+        
+        Construye un PPM binario en memoria que Tk decodifica directamente.
+        Pensado para miniaturas, donde el coste fijo de ImageTk es dominante.
+        
+        Args:
+            rgb (numpy.ndarray): Imagen RGB (alto, ancho, 3) de tipo uint8.
             
-            # Añadir un borde a la imagen
-            border_width = 2
-            canvas.create_rectangle(
-                canvas_width//2 - new_width//2 - border_width,
-                canvas_height//2 - new_height//2 - border_width,
-                canvas_width//2 + new_width//2 + border_width,
-                canvas_height//2 + new_height//2 + border_width,
-                outline=self.colors["primary"], width=border_width
-            )
+        Returns:
+            tk.PhotoImage: Imagen lista para mostrar en un canvas.
+        """
+        height, width = rgb.shape[:2]
+        ppm = f"P6\n{width} {height}\n255\n".encode("ascii") + np.ascontiguousarray(rgb).tobytes()
+        return tk.PhotoImage(width=width, height=height, data=base64.b64encode(ppm), format="PPM")
+    
+    def _show_canvas_error(self, canvas):
+        """
+        Muestra un mensaje de error en lugar de la imagen de un canvas.
+        
+        Args:
+            canvas: Canvas donde mostrar el mensaje.
+        """
+        items = self._canvas_items[canvas]
+        canvas_width, canvas_height = canvas.winfo_width(), canvas.winfo_height()
+        canvas.coords(items['background'], 0, 0, canvas_width, canvas_height)
+        canvas.coords(items['error'], canvas_width // 2, canvas_height // 2)
+        canvas.itemconfig(items['border'], state=tk.HIDDEN)
+        canvas.itemconfig(items['image'], state=tk.HIDDEN)
+        canvas.itemconfig(items['error'], state=tk.NORMAL)
+    
+    @staticmethod
+    def _jpeg_reduction_factor(image_path, canvas_width, canvas_height):
+        """
+        Calcula la reducción (1, 2, 4 u 8) con la que decodificar un JPEG para un canvas.
+        
+        libjpeg puede decodificar directamente a 1/2, 1/4 o 1/8 del tamaño escalando
+        en el dominio DCT. Se elige la mayor reducción que conserva al menos el doble
+        de resolución que la vista previa. Solo se lee la cabecera del archivo.
+        
+        Args:
+            image_path (str): Ruta de la imagen.
+            canvas_width (int): Ancho del canvas.
+            canvas_height (int): Alto del canvas.
             
-            # Mostrar imagen
-            canvas.create_image(canvas_width // 2, canvas_height // 2, 
-                              anchor=tk.CENTER, image=photo_img)
+        Returns:
+            int: Factor de reducción (1 si la imagen no es JPEG).
+        """
+        try:
+            with Image.open(image_path) as header:
+                if header.format != 'JPEG':
+                    return 1
+                img_width, img_height = header.size
+        except Exception:
+            return 1
+        
+        ratio = min(canvas_width / img_width, canvas_height / img_height)
+        for factor in (8, 4, 2):
+            if 2 * factor * ratio <= 1:
+                return factor
+        return 1
+    
+    def _decode_image(self, image_path, mtime, factor=1):
+        """
+        Decodifica una imagen, reutilizando decodificaciones recientes.
+        
+        Puede llamarse desde varios hilos de trabajo a la vez. Si ya hay en caché
+        una decodificación completa (por ejemplo, el resultado recién generado),
+        se reutiliza aunque se pida una reducción.
+        
+        Args:
+            image_path (str): Ruta de la imagen.
+            mtime (float): Fecha de modificación de la imagen.
+            factor (int, opcional): Reducción de la decodificación (1, 2, 4 u 8).
+                Por defecto es 1 (resolución completa).
             
-            # Guardar referencia para evitar que sea eliminada por el recolector de basura
-            if canvas == self.source_canvas:
-                self.source_img = photo_img
-            elif canvas == self.target_canvas:
-                self.target_img = photo_img
-            elif canvas == self.result_canvas:
-                self.result_img = photo_img
+        Returns:
+            numpy.ndarray o PIL.Image.Image: Imagen BGR de OpenCV o, para formatos
+                que OpenCV no soporta, imagen de Pillow.
+        """
+        key = (image_path, mtime, factor)
+        full_key = (image_path, mtime, 1)
+        with self._decoded_lock:
+            for cached_key in (key, full_key):
+                source = self._decoded_cache.get(cached_key)
+                if source is not None:
+                    self._decoded_cache.move_to_end(cached_key)
+                    return source
+        
+        # Cargar con OpenCV; Pillow solo para formatos que OpenCV no soporta
+        source = cv2.imread(image_path, _IMREAD_REDUCED_FLAGS[factor])
+        if source is None:
+            source = Image.open(image_path)
+            source.load()
+        
+        with self._decoded_lock:
+            self._cache_put(self._decoded_cache, key, source, DECODED_CACHE_SIZE)
+        return source
+    
+    @staticmethod
+    def _cache_put(cache, key, value, max_size):
+        """
+        Guarda un valor en una caché LRU, descartando la entrada más antigua si se llena.
         
-        except Exception as e:
-            self.logger.error(f"Error al mostrar imagen: {e}")
-            canvas.delete("all")
-            canvas.create_rectangle(0, 0, canvas.winfo_width(), canvas.winfo_height(), 
-                                   fill=self.colors["gray_light"], outline="")
-            canvas.create_text(canvas.winfo_width() // 2, canvas.winfo_height() // 2, 
-                              text="Error al cargar imagen", fill=self.colors["accent"], 
-                              font=("Segoe UI", 11, "bold"))
+        Args:
+            cache (collections.OrderedDict): Caché a actualizar.
+            key: Clave de la entrada.
+            value: Valor a guardar.
+            max_size (int): Número máximo de entradas.
+        """
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
     
     def on_view_result(self):
         """
@@ -668,8 +1127,7 @@ class AppWindow:
         
         try:
             # Copiar archivo
-            import shutil
-            shutil.copy2(self.result_img_path, file_path)
+            fast_copy(self.result_img_path, file_path)
             self.logger.info(f"Resultado guardado como: {file_path}")
             
             # Mostrar mensaje de éxito
@@ -1 +1,2 @@
 from .image_utils import ImageUtils 
+from .file_utils import fast_copy
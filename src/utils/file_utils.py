@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Módulo de utilidades para el manejo de archivos.
+
+Este módulo contiene funciones auxiliares para copiar archivos
+de forma eficiente usando las llamadas nativas de cada sistema.
+"""
+
+import os
+import shutil
+import stat
+import sys
+
+# Tamaño del búfer para la copia genérica (256 KiB)
+COPY_BUFFER_SIZE = 256 * 1024
+
+# Petición ioctl de Linux para clonar un archivo completo (reflink)
+FICLONE = 0x40049409
+
+def fast_copy(src, dst):
+    """
+    Copia un archivo, sus permisos y sus fechas usando la vía más rápida disponible.
+
+    En Linux clona el archivo con `FICLONE` (reflink en btrfs/xfs, sin copiar
+    datos) o usa `os.copy_file_range` u `os.sendfile` para copiar dentro del
+    kernel, en Windows `CopyFile2` y en el resto de sistemas una copia con
+    búfer grande.
+
+    No se usan enlaces duros: el destino compartiría los datos con el origen y
+    cambiaría si este se sobrescribe después.
+
+    Args:
+        src (str): Ruta del archivo de origen.
+        dst (str): Ruta del archivo de destino.
+
+    Returns:
+        str: Ruta del archivo de destino.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    if sys.platform.startswith('linux'):
+        _copy_sendfile(src, dst)
+    elif sys.platform == 'win32':
+        _copy_windows(src, dst)
+    else:
+        _copy_buffered(src, dst)
+
+    # Conservar los permisos y las fechas, como shutil.copy2 (sin atributos extendidos)
+    st = os.stat(src)
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return dst
+
+def _copy_sendfile(src, dst):
+    """
+    Copia el contenido de un archivo dentro del kernel (sin pasar por espacio de usuario).
+
+    Prueba primero a clonar el archivo con `FICLONE` y, si el sistema de archivos
+    no lo admite, `os.copy_file_range` y después `os.sendfile`.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        if _clone_file(fsrc.fileno(), fdst.fileno()):
+            return
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        for copy_func in (_copy_file_range_chunk, _sendfile_chunk):
+            # copy_file_range usa desplazamientos explícitos y no mueve la posición
+            # del destino, pero sendfile escribe en ella: situarla donde se quedó
+            # la copia para continuar tras un fallo parcial
+            os.lseek(fdst.fileno(), offset, os.SEEK_SET)
+            try:
+                while offset < size:
+                    sent = copy_func(fsrc.fileno(), fdst.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                break
+            except (OSError, AttributeError):
+                # Llamada no disponible o no soportada: probar la siguiente
+                continue
+        if offset < size:
+            # Sistema de archivos sin soporte: continuar con copia por búfer
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst, length=COPY_BUFFER_SIZE)
+
+def _clone_file(fd_src, fd_dst):
+    """
+    Clona un archivo completo con el ioctl `FICLONE` (copia en escritura).
+
+    Returns:
+        bool: True si se clonó, False si no está soportado (otro sistema de
+              archivos, distinto dispositivo, etc.).
+    """
+    try:
+        import fcntl
+        fcntl.ioctl(fd_dst, FICLONE, fd_src)
+        return True
+    except (ImportError, OSError):
+        return False
+
+def _copy_file_range_chunk(fd_src, fd_dst, offset, count):
+    """
+    Copia un bloque con `os.copy_file_range` (Python 3.8+, Linux 4.5+).
+    """
+    return os.copy_file_range(fd_src, fd_dst, count, offset, offset)
+
+def _sendfile_chunk(fd_src, fd_dst, offset, count):
+    """
+    Copia un bloque con `os.sendfile`.
+    """
+    return os.sendfile(fd_dst, fd_src, offset, count)
+
+def _copy_windows(src, dst):
+    """
+    Copia el contenido de un archivo con `CopyFile2` de la API de Windows.
+    """
+    import ctypes
+
+    try:
+        copy_file2 = ctypes.windll.kernel32.CopyFile2
+    except AttributeError:
+        # Windows anterior a 8: no existe CopyFile2
+        _copy_buffered(src, dst)
+        return
+
+    result = copy_file2(ctypes.c_wchar_p(os.path.abspath(src)),
+                        ctypes.c_wchar_p(os.path.abspath(dst)), None)
+    if result != 0:
+        _copy_buffered(src, dst)
+
+def _copy_buffered(src, dst):
+    """
+    Copia el contenido de un archivo en bloques de `COPY_BUFFER_SIZE` bytes.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, length=COPY_BUFFER_SIZE)
@@ -9,11 +9,19 @@ auxiliares para el procesamiento y manipulación de imágenes.
 """
 
 import logging
+import mmap
 import os
+import threading
 import cv2
 import numpy as np
 from PIL import Image
 
+# Tamaño (bytes) a partir del cual las imágenes se leen con una proyección en memoria
+MMAP_MIN_SIZE = 4 * 1024 * 1024
+
+# Número máximo de marcas de agua rasterizadas en caché
+WATERMARK_CACHE_SIZE = 32
+
 class ImageUtils:
     """
     Clase de utilidades para el procesamiento de imágenes.
@@ -22,12 +30,18 @@ class ImageUtils:
     como redimensionamiento, conversión, carga y guardado.
     """
     
+    # Marcas de agua rasterizadas, compartidas entre instancias
+    _watermark_sprites = {}
+    
     def __init__(self):
         """
         Inicializa la clase de utilidades de imagen.
         """
         self.logger = logging.getLogger('FaceSwapPro.ImageUtils')
         self.logger.info("Inicializando utilidades de imagen...")
+        
+        # Búferes temporales reutilizables, locales a cada hilo
+        self._buf_cache = threading.local()
     
     def load_image(self, image_path):
         """
@@ -44,7 +58,17 @@ class ImageUtils:
             return None
         
         try:
-            image = cv2.imread(image_path)
+            if os.path.getsize(image_path) > MMAP_MIN_SIZE:
+                # Archivos grandes: decodificar desde una proyección en memoria del
+                # archivo, sin leerlo antes a un búfer intermedio
+                with open(image_path, 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    buffer = np.frombuffer(mapped, dtype=np.uint8)
+                    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+                    # Liberar la vista antes de cerrar la proyección
+                    del buffer
+            else:
+                image = cv2.imread(image_path)
             
             if image is None:
                 self.logger.error(f"No se pudo cargar la imagen: {image_path}")
@@ -57,14 +81,16 @@ class ImageUtils:
             self.logger.error(f"Error al cargar la imagen: {e}")
             return None
     
-    def save_image(self, image, output_path, quality=95):
+    def save_image(self, image, output_path, quality=95, compression_level=1):
         """
         Guarda una imagen en un archivo.
         
         Args:
             image (numpy.ndarray): Imagen en formato OpenCV (BGR).
             output_path (str): Ruta donde guardar la imagen.
-            quality (int, opcional): Calidad de la imagen (0-100). Por defecto es 95.
+            quality (int, opcional): Calidad JPEG de la imagen (0-100). Por defecto es 95.
+            compression_level (int, opcional): Nivel de compresión PNG (0-9). Por defecto
+                es 1: mucho más rápido que 9 a cambio de archivos algo más grandes.
             
         Returns:
             bool: True si se guardó correctamente, False en caso contrario.
@@ -78,10 +104,14 @@ class ImageUtils:
             
             if ext == '.jpg' or ext == '.jpeg':
                 # Guardar como JPEG
-                cv2.imwrite(output_path, image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                cv2.imwrite(output_path, image, [cv2.IMWRITE_JPEG_QUALITY, quality,
+                                                 cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                                                 cv2.IMWRITE_JPEG_PROGRESSIVE, 0])
             elif ext == '.png':
                 # Guardar como PNG
-                cv2.imwrite(output_path, image, [cv2.IMWRITE_PNG_COMPRESSION, min(9, 100 - quality // 10)])
+                cv2.imwrite(output_path, image, [cv2.IMWRITE_PNG_COMPRESSION, compression_level,
+                                                 cv2.IMWRITE_PNG_STRATEGY,
+                                                 cv2.IMWRITE_PNG_STRATEGY_DEFAULT])
             else:
                 # Guardar con configuración predeterminada
                 cv2.imwrite(output_path, image)
@@ -102,7 +132,7 @@ class ImageUtils:
             max_size (int, opcional): Tamaño máximo (ancho o alto). Por defecto es 1920.
             
         Returns:
-            numpy.ndarray: Imagen redimensionada.
+            numpy.ndarray: Imagen redimensionada, o la misma imagen si ya cabe en `max_size`.
         """
         # Obtener dimensiones actuales
         height, width = image.shape[:2]
@@ -112,12 +142,16 @@ class ImageUtils:
         if height > max_size or width > max_size:
             scale = min(max_size / height, max_size / width)
         
+        # Sin cambio de tamaño: devolver la imagen tal cual
+        if scale == 1.0:
+            return image
+        
         # Calcular nuevas dimensiones
         new_width = int(width * scale)
         new_height = int(height * scale)
         
-        # Redimensionar imagen
-        resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LANCZOS4)
+        # Reducir imagen (nunca se amplía: INTER_AREA es más rápido y sin aliasing)
+        resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
         
         return resized
     
@@ -131,68 +165,150 @@ class ImageUtils:
         Returns:
             PIL.Image: Imagen en formato PIL (RGB).
         """
-        # Convertir de BGR a RGB
-        rgb_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
-        
-        # Convertir a formato PIL
-        pil_image = Image.fromarray(rgb_image)
+        # Pillow lee directamente los bytes BGR y los reordena al copiarlos,
+        # sin crear una imagen RGB intermedia
+        height, width = cv_image.shape[:2]
+        pil_image = Image.frombuffer('RGB', (width, height), np.ascontiguousarray(cv_image),
+                                     'raw', 'BGR', 0, 1)
         
         return pil_image
     
-    def convert_to_cv(self, pil_image):
+    def convert_to_cv(self, pil_image, contiguous=True):
         """
         Convierte una imagen de PIL a formato OpenCV.
         
         Args:
             pil_image (PIL.Image): Imagen en formato PIL.
+            contiguous (bool, opcional): Si es False, devuelve una vista BGR de solo
+                lectura sobre los píxeles RGB, sin copiarlos. Por defecto es True.
             
         Returns:
             numpy.ndarray: Imagen en formato OpenCV (BGR).
         """
-        # Convertir de PIL a numpy array (RGB)
-        rgb_image = np.array(pil_image)
+        # Decodificar primero los píxeles si la imagen aún es perezosa (recién abierta),
+        # para no decodificar durante la conversión y duplicar el pico de memoria
+        pil_image.load()
+        
+        # Otros modos (RGBA, L, P...) se llevan a RGB: la salida siempre es de 3 canales
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
         
-        # Convertir de RGB a BGR
-        cv_image = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR)
+        # Obtener los píxeles RGB sin copia adicional
+        rgb_image = np.asarray(pil_image)
+        
+        if not contiguous:
+            # Invertir el orden de los canales como vista
+            return rgb_image[..., ::-1]
+        
+        # Intercambiar los canales R y B en un destino reservado de antemano:
+        # es solo un intercambio de bytes, sin conversión de color
+        cv_image = np.empty(rgb_image.shape[:2] + (3,), dtype=rgb_image.dtype)
+        cv2.mixChannels([rgb_image], [cv_image], [0, 2, 1, 1, 2, 0])
         
         return cv_image
     
-    def apply_watermark(self, image, text="FaceSwapPro"):
+    def apply_watermark(self, image, text="FaceSwapPro", inplace=True):
         """
         Aplica una marca de agua de texto a una imagen.
         
         Args:
             image (numpy.ndarray): Imagen en formato OpenCV (BGR).
             text (str, opcional): Texto de la marca de agua. Por defecto es "FaceSwapPro".
+            inplace (bool, opcional): Si es True, dibuja directamente sobre `image`.
+                Si es False, trabaja sobre una copia. Por defecto es True.
             
         Returns:
-            numpy.ndarray: Imagen con marca de agua.
+            numpy.ndarray: Imagen con marca de agua (la propia `image` si `inplace`).
         """
-        result = image.copy()
+        result = image if inplace else image.copy()
         
         # Obtener dimensiones de la imagen
         h, w = result.shape[:2]
         
         # Configurar fuente
-        font = cv2.FONT_HERSHEY_SIMPLEX
         font_scale = w / 1500.0  # Escalar según tamaño de imagen
         font_thickness = max(1, int(w / 1000.0))
         
-        # Obtener tamaño del texto
-        text_size = cv2.getTextSize(text, font, font_scale, font_thickness)[0]
+        # Texto con sombra ya rasterizado (se reutiliza entre llamadas)
+        premult, inv_alpha, text_width, (origin_x, origin_y) = self._get_watermark_sprite(
+            text, font_scale, font_thickness
+        )
         
         # Posición del texto (esquina inferior derecha)
-        text_x = w - text_size[0] - 10
+        text_x = w - text_width - 10
         text_y = h - 10
         
-        # Dibujar texto con sombra
-        cv2.putText(result, text, (text_x + 2, text_y + 2), font, font_scale,
-                   (0, 0, 0, 128), font_thickness, cv2.LINE_AA)
-        cv2.putText(result, text, (text_x, text_y), font, font_scale,
-                   (255, 255, 255, 200), font_thickness, cv2.LINE_AA)
+        # Región de la imagen cubierta por el texto, recortada a sus límites
+        x0, y0 = text_x - origin_x, text_y - origin_y
+        sprite_h, sprite_w = premult.shape[:2]
+        sx0, sy0 = max(0, -x0), max(0, -y0)
+        sx1, sy1 = min(sprite_w, w - x0), min(sprite_h, h - y0)
+        if sx1 <= sx0 or sy1 <= sy0:
+            return result
+        
+        # Mezclar solo la región del texto: fondo * (1 - alfa) + color premultiplicado
+        roi = result[y0 + sy0:y0 + sy1, x0 + sx0:x0 + sx1]
+        blended = self._get_buf('watermark', roi.shape, np.float32)
+        np.multiply(roi, inv_alpha[sy0:sy1, sx0:sx1], out=blended)
+        np.add(blended, premult[sy0:sy1, sx0:sx1], out=blended)
+        np.copyto(roi, blended, casting='unsafe')
         
         return result
     
+    @classmethod
+    def _get_watermark_sprite(cls, text, font_scale, font_thickness):
+        """
+        Rasteriza una vez el texto de la marca de agua con su sombra.
+        
+        Args:
+            text (str): Texto de la marca de agua.
+            font_scale (float): Escala de la fuente.
+            font_thickness (int): Grosor del trazo.
+            
+        Returns:
+            tuple: Color premultiplicado y (1 - alfa) como float32 (alto, ancho, 3),
+                ancho del texto y posición (x, y) del origen del texto en el sprite.
+        """
+        key = (text, font_scale, font_thickness)
+        sprite = cls._watermark_sprites.get(key)
+        if sprite is not None:
+            return sprite
+        
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        (text_width, text_height), baseline = cv2.getTextSize(text, font, font_scale,
+                                                              font_thickness)
+        
+        # Margen para el trazo, el suavizado y el desplazamiento de la sombra
+        pad = font_thickness + 2
+        origin = (pad, text_height + pad)
+        size = (text_height + baseline + 2 + 2 * pad, text_width + 2 + 2 * pad)
+        
+        # Coberturas (0-255) de la sombra y del texto dibujados con suavizado
+        shadow = np.zeros(size, dtype=np.uint8)
+        cv2.putText(shadow, text, (origin[0] + 2, origin[1] + 2), font, font_scale,
+                    255, font_thickness, cv2.LINE_AA)
+        fore = np.zeros(size, dtype=np.uint8)
+        cv2.putText(fore, text, origin, font, font_scale, 255, font_thickness, cv2.LINE_AA)
+        
+        # Sombra negra y texto blanco encima, como alfa y color premultiplicado
+        a_shadow = shadow.astype(np.float32) / 255.0
+        a_fore = fore.astype(np.float32) / 255.0
+        inv_alpha = (1.0 - a_shadow) * (1.0 - a_fore)
+        premult = 255.0 * a_fore + 0.5  # +0.5 para redondear al truncar
+        
+        sprite = (
+            np.repeat(premult[:, :, None], 3, axis=2),
+            np.repeat(inv_alpha[:, :, None], 3, axis=2),
+            text_width,
+            origin,
+        )
+        
+        # El tamaño de fuente depende del ancho de la imagen: limitar la caché
+        if len(cls._watermark_sprites) >= WATERMARK_CACHE_SIZE:
+            cls._watermark_sprites.clear()
+        cls._watermark_sprites[key] = sprite
+        return sprite
+    
     def create_comparison_image(self, original, result):
         """
         Crea una imagen de comparación lado a lado.
@@ -209,14 +325,26 @@ class ImageUtils:
         h2, w2 = result.shape[:2]
         
         h = max(h1, h2)
-        w = w1 + w2
         
-        # Crear imagen combinada
-        comparison = np.zeros((h, w, 3), dtype=np.uint8)
+        # Completar con negro por debajo la imagen más baja (en un búfer reutilizable,
+        # ya que solo se usa hasta concatenar)
+        if h1 < h:
+            original = cv2.copyMakeBorder(original, 0, h - h1, 0, 0,
+                                          cv2.BORDER_CONSTANT,
+                                          dst=self._get_buf('padding',
+                                                            (h,) + original.shape[1:],
+                                                            original.dtype),
+                                          value=(0, 0, 0))
+        if h2 < h:
+            result = cv2.copyMakeBorder(result, 0, h - h2, 0, 0,
+                                        cv2.BORDER_CONSTANT,
+                                        dst=self._get_buf('padding',
+                                                          (h,) + result.shape[1:],
+                                                          result.dtype),
+                                        value=(0, 0, 0))
         
-        # Colocar imágenes
-        comparison[:h1, :w1] = original
-        comparison[:h2, w1:w1+w2] = result
+        # Crear imagen combinada sin inicializarla a cero antes de copiar
+        comparison = cv2.hconcat([original, result])
         
         # Dibujar línea separadora
         cv2.line(comparison, (w1, 0), (w1, h), (0, 0, 255), 2)
@@ -227,4 +355,32 @@ class ImageUtils:
         cv2.putText(comparison, "Resultado", (w1 + 10, 30), cv2.FONT_HERSHEY_SIMPLEX, 
                    1, (0, 255, 0), 2, cv2.LINE_AA)
         
-        return comparison
\ No newline at end of file
+        return comparison
+    
+    def _get_buf(self, purpose, shape, dtype):
+        """
+        Obtiene un búfer temporal del hilo actual para un uso concreto.
+        
+        Cada uso tiene un único búfer que solo crece cuando se pide una forma
+        mayor, por lo que imágenes de tamaños distintos no acumulan búferes. Su
+        contenido solo es válido hasta la próxima llamada con el mismo uso y
+        nunca debe devolverse al llamador.
+        
+        Args:
+            purpose (str): Nombre del uso del búfer (por ejemplo, 'watermark').
+            shape (tuple): Forma del búfer.
+            dtype (numpy.dtype): Tipo de los elementos.
+            
+        Returns:
+            numpy.ndarray: Búfer contiguo sin inicializar con la forma pedida.
+        """
+        buffers = getattr(self._buf_cache, 'arrays', None)
+        if buffers is None:
+            buffers = self._buf_cache.arrays = {}
+        
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buf = buffers.get(purpose)
+        if buf is None or buf.dtype != dtype or buf.size < size:
+            buf = buffers[purpose] = np.empty(size, dtype=dtype)
+        return buf[:size].reshape(shape)
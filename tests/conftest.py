@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Configuración de pytest para las pruebas de FaceSwapPro.
+
+Agrupa las pruebas por clase para que, al ejecutarlas en paralelo con
+pytest-xdist (`pytest -n auto --dist loadgroup`), cada clase se ejecute
+completa en un mismo proceso y sus recursos de `setUpClass` (como los
+modelos del detector) se carguen una sola vez por proceso.
+"""
+
+import pytest
+
+def pytest_configure(config):
+    """
+    Registra el marcador `xdist_group`, también cuando pytest-xdist no está instalado.
+    
+    Args:
+        config: Configuración de pytest.
+    """
+    config.addinivalue_line(
+        "markers", "xdist_group(name): ejecuta en el mismo proceso las pruebas del grupo"
+    )
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Marca cada prueba con el grupo de xdist de su clase.
+    
+    Args:
+        config: Configuración de pytest.
+        items (list): Pruebas recogidas.
+    """
+    for item in items:
+        if item.cls is not None:
+            item.add_marker(pytest.mark.xdist_group(item.cls.__name__))
@@ -9,53 +9,139 @@ el funcionamiento correcto de los componentes principales.
 """
 
 import unittest
+import gc
 import os
 import sys
 import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from unittest import mock
+
+# Un solo hilo por biblioteca numérica (antes de importarlas): las pruebas son
+# muy cortas y, con varios procesos de pytest-xdist, los hilos se estorbarían
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
 import cv2
 import numpy as np
+from PIL import Image
+
+cv2.setNumThreads(1)
 
 # Añadir directorio raíz al path para importar los módulos
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.core import FaceDetector
+# Ejecutar los modelos solo en CPU: evita inicializar CUDA/TensorRT en las pruebas
+os.environ.setdefault('FSP_CPU_ONLY', '1')
+
+from src.core import FaceDetector, ImageEnhancer
 from src.utils import ImageUtils
 
 # Desactivar logging durante las pruebas
 logging.disable(logging.CRITICAL)
 
+@contextmanager
+def _no_gc():
+    """
+    Desactiva el recolector de basura durante un bloque con muchas reservas de memoria.
+    
+    Al salir lo reactiva y hace una recolección completa, fuera del código medido.
+    """
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+        gc.collect()
+
+# Objeto "face" simulado con la información que necesita crop_face
+MockFace = namedtuple('MockFace', ['bbox'])
+_MOCK_BBOX = np.array([50, 50, 250, 250], dtype=np.float32)  # x1, y1, x2, y2
+
+def _make_synth_face():
+    """
+    Crea una imagen sintética con un "rostro" (un círculo).
+    
+    Returns:
+        numpy.ndarray: Imagen BGR de 300x300 de solo lectura.
+    """
+    # Todas las figuras se calculan con máscaras sobre una rejilla y se pintan en
+    # una sola pasada, en lugar de una llamada de dibujo de cv2 por figura
+    yy, xx = np.ogrid[:300, :300]
+    conditions = [
+        (xx - 120) ** 2 + (yy - 120) ** 2 <= 15 ** 2,  # Ojo izquierdo
+        (xx - 180) ** 2 + (yy - 120) ** 2 <= 15 ** 2,  # Ojo derecho
+        (((xx - 150) / 50) ** 2 + ((yy - 180) / 20) ** 2 <= 1) & (yy >= 180),  # Boca
+        (xx - 150) ** 2 + (yy - 150) ** 2 <= 100 ** 2,  # Rostro
+    ]
+    gray = np.select(conditions, [255, 255, 255, 0], default=255).astype(np.uint8)
+    img = np.repeat(gray[:, :, np.newaxis], 3, axis=2)
+    
+    # Solo lectura: una prueba que la modifique por error fallará
+    img.setflags(write=False)
+    return img
+
+# Imagen sintética dibujada una sola vez por proceso
+_SYNTH_FACE = _make_synth_face()
+
+def setUpModule():
+    """
+    Calienta una vez las rutas de conversión y redimensionado antes de las pruebas.
+    
+    Las primeras llamadas a OpenCV y Pillow inicializan de forma perezosa sus
+    despachadores y decodificadores; así ese coste no recae en la primera prueba.
+    """
+    utils = ImageUtils()
+    warmup_img = np.full((16, 16, 3), 255, dtype=np.uint8)
+    utils.resize_image(warmup_img, max_size=8)
+    utils.convert_to_cv(utils.convert_to_pil(warmup_img))
+
 class TestFaceDetector(unittest.TestCase):
     """
     Pruebas unitarias para el detector de rostros.
     """
     
+    @classmethod
+    def setUpClass(cls):
+        """
+        Crea una sola vez el detector compartido por las pruebas de la clase.
+        """
+        # Cargar los modelos una única vez para todas las pruebas
+        with _no_gc():
+            cls.detector = FaceDetector()
+    
     def setUp(self):
         """
         Prepara el entorno para las pruebas.
         """
-        self.detector = FaceDetector()
-        
-        # Crear una imagen sintética con un "rostro" (un círculo)
-        self.test_img = np.ones((300, 300, 3), dtype=np.uint8) * 255
-        cv2.circle(self.test_img, (150, 150), 100, (0, 0, 0), -1)
-        cv2.circle(self.test_img, (120, 120), 15, (255, 255, 255), -1)  # Ojo izquierdo
-        cv2.circle(self.test_img, (180, 120), 15, (255, 255, 255), -1)  # Ojo derecho
-        cv2.ellipse(self.test_img, (150, 180), (50, 20), 0, 0, 180, (255, 255, 255), -1)  # Boca
+        # Las pruebas solo leen la imagen: se comparte sin copiarla
+        self.test_img = _SYNTH_FACE
+        self.assertTrue(self.test_img.flags['C_CONTIGUOUS'])
     
     def test_init(self):
         """
         Prueba que el detector se inicialice correctamente.
         """
-        self.assertIsNotNone(self.detector.app)
+        self.assertIsNotNone(type(self).detector.app)
     
     def test_detect_faces_empty(self):
         """
         Prueba la detección en una imagen vacía.
         """
-        empty_img = np.ones((100, 100, 3), dtype=np.uint8) * 255
+        empty_img = np.full((64, 64, 3), 255, dtype=np.uint8)
         faces = self.detector.detect_faces(empty_img)
         self.assertEqual(len(faces), 0)
     
+    def test_detect_faces_batch_empty(self):
+        """
+        Prueba la detección por lotes en imágenes vacías.
+        """
+        batch = np.empty((4, 64, 64, 3), dtype=np.uint8)
+        batch[...] = 255
+        results = self.detector.detect_faces_batch(batch)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(len(faces) == 0 for faces in results))
+    
     def test_crop_face(self):
         """
         Prueba la funcionalidad de recortar un rostro.
@@ -63,39 +149,50 @@ class TestFaceDetector(unittest.TestCase):
         # Esta prueba solo verifica que la función no falle
         # No podemos usar detect_faces con la imagen sintética porque InsightFace
         # requiere rostros realistas, pero podemos simular un objeto "face" con la información necesaria
-        
-        class MockFace:
-            def __init__(self):
-                self.bbox = np.array([50, 50, 250, 250])  # x1, y1, x2, y2
-        
-        mock_face = MockFace()
+        mock_face = MockFace(_MOCK_BBOX)
         cropped = self.detector.crop_face(self.test_img, mock_face)
         
         # Verificar que el recorte tiene el tamaño esperado
-        # Con un factor de expansión de 1.5, el recorte debería ser más grande que el bbox original
-        self.assertGreater(cropped.shape[0], 200)  # height
-        self.assertGreater(cropped.shape[1], 200)  # width
+        # Con un factor de expansión de 1.5, el bbox de 200x200 centrado en (150, 150)
+        # pasa a 300x300, que ocupa exactamente toda la imagen
+        self.assertEqual(cropped.shape[:2], (300, 300))
 
 class TestImageUtils(unittest.TestCase):
     """
     Pruebas unitarias para las utilidades de imagen.
     """
     
+    @classmethod
+    def setUpClass(cls):
+        """
+        Crea una sola vez las imágenes compartidas por las pruebas de la clase.
+        """
+        with _no_gc():
+            # Crear una imagen de prueba
+            cls._base_img = np.full((100, 100, 3), 255, dtype=np.uint8)
+            cls._base_img.flags.writeable = False
+            
+            # Crear una imagen grande
+            # (np.full: una reserva y un relleno; cv2.resize necesita un búfer contiguo,
+            # por lo que no sirve una vista de np.broadcast_to)
+            cls._large_img = np.full((2000, 1000, 3), 255, dtype=np.uint8)
+            cls._large_img.flags.writeable = False
+    
     def setUp(self):
         """
         Prepara el entorno para las pruebas.
         """
         self.utils = ImageUtils()
         
-        # Crear una imagen de prueba
-        self.test_img = np.ones((100, 100, 3), dtype=np.uint8) * 255
+        # Imagen compartida de solo lectura (copiarla antes de modificarla)
+        self.test_img = type(self)._base_img
+        self.assertTrue(self.test_img.flags['C_CONTIGUOUS'])
     
     def test_resize_image(self):
         """
         Prueba el redimensionamiento de imágenes.
         """
-        # Crear una imagen grande
-        large_img = np.ones((2000, 1000, 3), dtype=np.uint8) * 255
+        large_img = type(self)._large_img
         
         # Redimensionar con tamaño máximo
         resized = self.utils.resize_image(large_img, max_size=800)
@@ -103,31 +200,139 @@ class TestImageUtils(unittest.TestCase):
         # Verificar que el lado más grande no supera max_size
         self.assertLessEqual(max(resized.shape[0], resized.shape[1]), 800)
         
-        # Verificar que se mantiene la relación de aspecto
-        original_ratio = large_img.shape[0] / large_img.shape[1]
-        resized_ratio = resized.shape[0] / resized.shape[1]
-        self.assertAlmostEqual(original_ratio, resized_ratio, places=2)
+        # Verificar el tamaño exacto de la reducción (2000x1000 -> 800x400)
+        self.assertEqual(resized.shape, (800, 400, 3))
+        
+        # Verificar que se mantiene la relación de aspecto (h1/w1 == h2/w2 con
+        # productos enteros; la tolerancia cubre el redondeo a píxeles enteros)
+        h1, w1 = large_img.shape[:2]
+        h2, w2 = resized.shape[:2]
+        self.assertLessEqual(abs(h1 * w2 - h2 * w1), max(h1, w1))
     
     def test_convert_to_pil_and_back(self):
         """
         Prueba la conversión entre OpenCV y PIL.
         """
         # Dibujar algo en la imagen para asegurar que los datos cambian
+        self.test_img = self.test_img.copy()
         cv2.rectangle(self.test_img, (10, 10), (90, 90), (0, 0, 255), -1)
         
         # Convertir a PIL
         pil_img = self.utils.convert_to_pil(self.test_img)
         
+        # Verificar que el orden de canales coincide con la conversión de OpenCV
+        expected_rgb = cv2.cvtColor(self.test_img, cv2.COLOR_BGR2RGB)
+        self.assertEqual(cv2.norm(expected_rgb, np.asarray(pil_img), cv2.NORM_L1), 0)
+        
         # Convertir de vuelta a OpenCV
         cv_img = self.utils.convert_to_cv(pil_img)
         
-        # Verificar que las dimensiones se mantienen
+        # Verificar que las dimensiones se mantienen y que el resultado es contiguo
+        # (las funciones de OpenCV tomarían la vía lenta con una vista invertida)
         self.assertEqual(self.test_img.shape, cv_img.shape)
+        self.assertTrue(cv_img.flags['C_CONTIGUOUS'])
+        
+        # Verificar que los datos son similares (puede haber pequeñas diferencias por la
+        # conversión); lo habitual es que sean idénticos y basta una comparación directa
+        if not np.array_equal(self.test_img, cv_img):
+            avg_diff = cv2.norm(self.test_img, cv_img, cv2.NORM_L1) / self.test_img.size
+            self.assertLessEqual(avg_diff, 1.0)  # Diferencia promedio menor a 1
+
+    def test_convert_to_cv_rgba(self):
+        """
+        Prueba que una imagen PIL RGBA se convierte a BGR de 3 canales.
+        """
+        rgba = np.zeros((20, 30, 4), dtype=np.uint8)
+        rgba[..., 0] = 10   # R
+        rgba[..., 1] = 20   # G
+        rgba[..., 2] = 30   # B
+        rgba[..., 3] = 128  # Alfa
+        pil_img = Image.fromarray(rgba, 'RGBA')
+        
+        cv_img = self.utils.convert_to_cv(pil_img)
+        
+        self.assertEqual(cv_img.shape, (20, 30, 3))
+        self.assertTrue(np.all(cv_img == (30, 20, 10)))
+
+class TestImageEnhancer(unittest.TestCase):
+    """
+    Pruebas unitarias para el mejorador de imágenes.
+    """
+    
+    # Rostro fijo (x, y, w, h) para que la detección no dependa del clasificador
+    FACES = [(50, 50, 200, 200)]
+    
+    @classmethod
+    def setUpClass(cls):
+        """
+        Crea una sola vez el mejorador compartido por las pruebas de la clase.
+        """
+        with _no_gc():
+            cls.enhancer = ImageEnhancer()
+            cls._target_img = np.full((300, 300, 3), (90, 120, 150), dtype=np.uint8)
+            cls._target_img.flags.writeable = False
+    
+    def test_apply_all_fused_matches_sequential(self):
+        """
+        Prueba que las mejoras combinadas dan el mismo resultado que la cadena secuencial.
+        """
+        enhancer = self.enhancer
+        
+        with mock.patch.object(enhancer, '_detect_faces', return_value=self.FACES):
+            for level in (1, 2, 3):
+                with self.subTest(level=level):
+                    fused = enhancer.apply_all_fused(_SYNTH_FACE, level,
+                                                     target_img=self._target_img,
+                                                     source_img=_SYNTH_FACE)
+                    
+                    # Cadena secuencial del intercambio, con los mismos rostros
+                    expected = enhancer.enhance_basic(_SYNTH_FACE)
+                    if level >= 2:
+                        expected = enhancer.enhance_skin(expected, self.FACES)
+                        expected = enhancer.enhance_facial_features(expected, self.FACES)
+                    if level >= 3:
+                        expected = enhancer.enhance_color_correction(
+                            expected, self._target_img, _SYNTH_FACE
+                        )
+                        expected = enhancer.enhance_hdr_effect(expected)
+                    
+                    self.assertEqual(fused.shape, expected.shape)
+                    self.assertTrue(np.array_equal(fused, expected))
+    
+    def test_plan_stages(self):
+        """
+        Prueba la secuencia de etapas de cada nivel y la forma de la imagen resultante.
+        """
+        enhancer = self.enhancer
+        expected_stages = {
+            (1, False): ['_stage_basic'],
+            (2, False): ['_stage_basic', '_stage_skin', '_stage_features'],
+            (3, False): ['_stage_basic', '_stage_skin', '_stage_features',
+                         '_stage_clahe_l', '_stage_hdr_saturation'],
+            (3, True): ['_stage_basic', '_stage_skin', '_stage_features',
+                        '_stage_color_correction', '_stage_clahe_l',
+                        '_stage_hdr_saturation'],
+        }
+        # La corrección de color solo forma parte del nivel 3
+        expected_stages[(1, True)] = expected_stages[(1, False)]
+        expected_stages[(2, True)] = expected_stages[(2, False)]
         
-        # Verificar que los datos son similares (puede haber pequeñas diferencias por la conversión)
-        diff = np.sum(np.abs(self.test_img.astype(int) - cv_img.astype(int)))
-        avg_diff = diff / (self.test_img.size)
-        self.assertLessEqual(avg_diff, 1.0)  # Diferencia promedio menor a 1
+        with mock.patch.object(enhancer, '_use_cuda', False), \
+                mock.patch.object(enhancer, '_detect_faces',
+                                  return_value=self.FACES) as detect:
+            for (level, color_correction), names in expected_stages.items():
+                with self.subTest(level=level, color_correction=color_correction):
+                    plan = enhancer._plan_stages(level, color_correction)
+                    self.assertEqual([stage.__name__ for _, stage, _ in plan], names)
+                    
+                    references = ({'target_img': self._target_img, 'source_img': _SYNTH_FACE}
+                                  if color_correction else {})
+                    detect.reset_mock()
+                    result = enhancer.apply_all_fused(_SYNTH_FACE, level, **references)
+                    self.assertEqual(result.shape, _SYNTH_FACE.shape)
+                    
+                    # Los rostros se detectan una sola vez (solo desde el nivel 2)
+                    self.assertEqual(detect.call_count, 1 if level >= 2 else 0)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file